@@ -1,51 +1,157 @@
 import logging
+import logging.handlers
 import asyncio
+import hashlib
+import queue
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, BackgroundTasks, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, BackgroundTasks, Depends, Request, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError
 from models.schemas import AlertWebhook, Alert, AnalysisResult
+from clients.deepseek import DeepSeekClient
+from clients.http import create_http_client, warm_up_connections
+from clients.loki import LokiClient
+from clients.prometheus import PrometheusClient
 from services.analyzer import AlertAnalyzer
 from services.notifier import NotificationService
 from config import settings
 
-# Configure logging
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that hands records to the listener thread unformatted
+    
+    The stock QueueHandler formats the message (including any traceback)
+    in the calling thread so records can be pickled; the queue here never
+    leaves the process, so that work is left to the listener thread.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# Configure logging: the event loop only enqueues records, and a background
+# listener thread does the formatting and writes
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers=[_DeferredQueueHandler(log_queue)]
 )
 logger = logging.getLogger(__name__)
 
-# Initialize services
-analyzer = AlertAnalyzer()
-notifier = NotificationService()
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Initialize services (all outbound clients share one connection pool)
+http_client = create_http_client()
+analyzer = AlertAnalyzer(
+    prometheus_client=PrometheusClient(http_client=http_client),
+    loki_client=LokiClient(http_client=http_client),
+    llm_client=DeepSeekClient(http_client=http_client)
+)
+notifier = NotificationService(http_client=http_client)
+
+# Alert queue for processing (bounded to apply back-pressure on bursts)
+alert_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.alert_queue_maxsize)
+
+# Alerts currently being analyzed, keyed by alert fingerprint
+inflight: Dict[str, asyncio.Future] = {}
+
+# Recently completed analyses (key -> (completed_at, result)), oldest first
+recent_analyses: "OrderedDict[str, Tuple[float, AnalysisResult]]" = OrderedDict()
+
+
+def _alert_key(alert: Alert) -> str:
+    """
+    Build a deduplication key identifying repeated firings of the same alert
+    
+    AlertManager's fingerprint identifies the full label set; when it is
+    missing (e.g. manual /analyze requests), a hash of the sorted labels is
+    used instead so alerts differing in any label are never merged.
+    """
+    fingerprint = alert.fingerprint
+    if not fingerprint:
+        labels = "\0".join(f"{k}={v}" for k, v in sorted(alert.labels.items()))
+        fingerprint = hashlib.sha256(labels.encode()).hexdigest()[:16]
+    return f"{fingerprint}|{alert.startsAt}"
 
-# Alert queue for processing
-alert_queue: asyncio.Queue = asyncio.Queue()
+
+def _get_recent_analysis(key: str) -> Optional[AnalysisResult]:
+    """Return a cached analysis for the key if it is still within the TTL"""
+    entry = recent_analyses.get(key)
+    if entry is None:
+        return None
+    
+    completed_at, result = entry
+    if time.monotonic() - completed_at > settings.alert_dedup_ttl_minutes * 60:
+        del recent_analyses[key]
+        return None
+    
+    return result
+
+
+def _remember_analysis(key: str, result: AnalysisResult):
+    """Store a completed analysis, evicting the oldest entries beyond the limit"""
+    recent_analyses[key] = (time.monotonic(), result)
+    recent_analyses.move_to_end(key)
+    while len(recent_analyses) > settings.alert_dedup_max_entries:
+        recent_analyses.popitem(last=False)
+
+
+def _finish_inflight(key: str, result: Optional[AnalysisResult]):
+    """Resolve and remove the in-flight future for the key"""
+    future = inflight.pop(key, None)
+    if future is not None and not future.done():
+        future.set_result(result)
+    if result:
+        _remember_analysis(key, result)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager for the application"""
     # Startup
+    log_listener.start()
     logger.info("Starting AIOps Alert Processor")
     logger.info(f"Prometheus URL: {settings.prometheus_url}")
     logger.info(f"Loki URL: {settings.loki_url}")
     logger.info(f"Huawei Cloud Model: {settings.huawei_model_name}")
     logger.info(f"Huawei API Endpoint: {settings.huawei_api_url}")
     logger.info(f"Time Window: {settings.time_window_minutes} minutes")
+    logger.info(f"Alert Workers: {settings.worker_concurrency}")
     
-    # Start background alert processor
-    processor_task = asyncio.create_task(process_alert_queue())
+    # Pre-open upstream connections so alerts arriving right after startup
+    # skip the handshakes (they expire after the pool's keep-alive window)
+    await warm_up_connections(http_client, [
+        ("GET", f"{settings.prometheus_url}/-/healthy"),
+        ("GET", f"{settings.loki_url}/ready"),
+        ("OPTIONS", settings.huawei_api_url)
+    ])
+    
+    # Start background alert processors
+    workers = [
+        asyncio.create_task(process_alert_queue(i))
+        for i in range(settings.worker_concurrency)
+    ]
     
     yield
     
     # Shutdown
     logger.info("Shutting down AIOps Alert Processor")
-    processor_task.cancel()
-    try:
-        await processor_task
-    except asyncio.CancelledError:
-        pass
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await notifier.aclose()
+    await http_client.aclose()
+    log_listener.stop()
 
 
 # Create FastAPI app
@@ -53,7 +159,8 @@ app = FastAPI(
     title="AIOps Alert Processor",
     description="AI-powered alert analysis and resolution system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -82,8 +189,76 @@ async def health_check():
     }
 
 
-@app.post("/webhook/alerts")
-async def receive_alerts(webhook: AlertWebhook, background_tasks: BackgroundTasks):
+def _json_body(model: Type[ModelT]) -> Callable[[Request], Awaitable[ModelT]]:
+    """
+    Build a dependency that parses a request body straight from raw bytes
+    
+    model_validate_json parses and validates in a single pass in
+    pydantic-core, instead of json.loads into dicts followed by validation.
+    
+    Args:
+        model: Pydantic model describing the body
+    
+    Returns:
+        FastAPI dependency returning the validated model
+    """
+    async def parse(request: Request) -> ModelT:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            # Match FastAPI's own error locations for request bodies
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+            )
+    
+    return parse
+
+
+def _json_body_openapi(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Build the openapi_extra documenting a body parsed by _json_body
+    
+    The body never goes through FastAPI's own parameter handling, so the
+    request schema has to be declared on the route explicitly. Nested model
+    definitions are inlined because pydantic's "#/$defs/..." references do
+    not resolve inside the OpenAPI document.
+    
+    Args:
+        model: Pydantic model describing the body
+    
+    Returns:
+        openapi_extra declaring the required JSON request body
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+    
+    def inline(node: Any) -> Any:
+        if isinstance(node, dict):
+            ref = node.get("$ref", "")
+            if ref.startswith("#/$defs/"):
+                return inline(defs[ref.removeprefix("#/$defs/")])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(item) for item in node]
+        return node
+    
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": inline(schema)}}
+        }
+    }
+
+
+parse_webhook = _json_body(AlertWebhook)
+parse_alert = _json_body(Alert)
+
+
+@app.post("/webhook/alerts", openapi_extra=_json_body_openapi(AlertWebhook))
+async def receive_alerts(
+    background_tasks: BackgroundTasks,
+    webhook: AlertWebhook = Depends(parse_webhook)
+):
     """
     Receive alerts from AlertManager
     
@@ -100,21 +275,53 @@ async def receive_alerts(webhook: AlertWebhook, background_tasks: BackgroundTask
         logger.info("No firing alerts to process")
         return {"status": "ok", "message": "No firing alerts", "processed": 0}
     
-    # Add alerts to the queue
+    # Add alerts to the queue, skipping repeats of alerts that are already
+    # being analyzed or were analyzed recently (flapping, group resends)
+    loop = asyncio.get_running_loop()
+    queued = 0
+    deduplicated = 0
+    overflowed = 0
     for alert in firing_alerts:
-        await alert_queue.put(alert)
+        key = _alert_key(alert)
+        if key in inflight or _get_recent_analysis(key) is not None:
+            deduplicated += 1
+            logger.info(f"Skipping duplicate alert: {alert.labels.get('alertname', 'Unknown')}")
+            continue
+        
+        try:
+            alert_queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            overflowed += 1
+            continue
+        inflight[key] = loop.create_future()
+        queued += 1
         logger.info(f"Queued alert: {alert.labels.get('alertname', 'Unknown')}")
     
+    # Ask AlertManager to resend later; already queued alerts are deduplicated
+    if overflowed:
+        logger.warning(f"Alert queue full, rejected {overflowed} alerts")
+        return ORJSONResponse(
+            status_code=503,
+            content={
+                "status": "error",
+                "message": f"Alert queue full, rejected {overflowed} alerts",
+                "processed": queued,
+                "rejected": overflowed,
+                "queue_size": alert_queue.qsize()
+            }
+        )
+    
     return {
         "status": "ok",
-        "message": f"Queued {len(firing_alerts)} alerts for analysis",
-        "processed": len(firing_alerts),
+        "message": f"Queued {queued} alerts for analysis",
+        "processed": queued,
+        "deduplicated": deduplicated,
         "queue_size": alert_queue.qsize()
     }
 
 
-@app.post("/analyze")
-async def analyze_single_alert(alert: Alert):
+@app.post("/analyze", openapi_extra=_json_body_openapi(Alert))
+async def analyze_single_alert(alert: Alert = Depends(parse_alert)):
     """
     Manually trigger analysis for a single alert
     
@@ -123,6 +330,21 @@ async def analyze_single_alert(alert: Alert):
     """
     logger.info(f"Manual analysis request for alert: {alert.labels.get('alertname', 'Unknown')}")
     
+    key = _alert_key(alert)
+    cached = _get_recent_analysis(key)
+    if cached is not None:
+        logger.info(f"Returning recent analysis for: {cached.alert_name}")
+        return cached
+    
+    # An identical alert is already being analyzed; share its result
+    if key in inflight:
+        result = await asyncio.shield(inflight[key])
+        if not result:
+            raise HTTPException(status_code=500, detail="Analysis failed")
+        return result
+    
+    inflight[key] = asyncio.get_running_loop().create_future()
+    result = None
     try:
         # Analyze the alert
         result = await analyzer.analyze_alert(alert)
@@ -142,6 +364,9 @@ async def analyze_single_alert(alert: Alert):
     except Exception as e:
         logger.error(f"Error analyzing alert: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    finally:
+        _finish_inflight(key, result)
 
 
 @app.get("/queue/status")
@@ -162,61 +387,85 @@ async def metrics():
     }
 
 
-async def process_alert_queue():
+async def process_alert_queue(worker_id: int = 0):
     """
     Background task that processes alerts from the queue
     
-    This runs continuously and processes alerts one by one,
-    ensuring sequential analysis with proper error handling.
+    Several of these run concurrently on the shared queue. After waking up
+    for one alert, a worker also drains whatever else is already queued (up
+    to ALERT_BATCH_SIZE) and analyzes the batch concurrently, so bursts are
+    picked up without a scheduler round-trip per alert.
+    
+    Args:
+        worker_id: Identifier used in log messages
     """
-    logger.info("Alert queue processor started")
+    logger.info(f"Alert queue processor {worker_id} started")
     
     while True:
         try:
-            # Wait for an alert from the queue
-            alert = await alert_queue.get()
-            
-            logger.info(f"Processing alert from queue: {alert.labels.get('alertname', 'Unknown')}")
+            # Wait for an alert from the queue, then take any others already waiting
+            alerts = [await alert_queue.get()]
+            while len(alerts) < settings.alert_batch_size:
+                try:
+                    alerts.append(alert_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
             
-            try:
-                # Analyze the alert
-                result = await analyzer.analyze_alert(alert)
-                
-                if result:
-                    # Send notification
-                    alert_context = {
-                        "instance": alert.labels.get("instance"),
-                        "generator_url": alert.generatorURL
-                    }
-                    notification_sent = await notifier.send_analysis(result, alert_context)
-                    
-                    if notification_sent:
-                        logger.info(f"Successfully analyzed and notified for: {result.alert_name}")
-                    else:
-                        logger.warning(f"Analysis completed but notification failed for: {result.alert_name}")
-                else:
-                    logger.error(f"Analysis failed for alert: {alert.labels.get('alertname', 'Unknown')}")
-                    
-            except Exception as e:
-                logger.error(f"Error processing alert: {e}", exc_info=True)
-            
-            finally:
-                # Mark task as done
-                alert_queue.task_done()
+            logger.info(f"Worker {worker_id} processing {len(alerts)} alert(s) from queue")
+            await asyncio.gather(*(_handle_alert(alert) for alert in alerts))
                 
         except asyncio.CancelledError:
-            logger.info("Alert queue processor cancelled")
+            logger.info(f"Alert queue processor {worker_id} cancelled")
             break
         except Exception as e:
             logger.error(f"Unexpected error in queue processor: {e}", exc_info=True)
             await asyncio.sleep(5)  # Wait before retrying
 
 
+async def _handle_alert(alert: Alert):
+    """
+    Analyze a single queued alert and send its notification
+    
+    Args:
+        alert: Alert taken from the queue
+    """
+    logger.info(f"Processing alert from queue: {alert.labels.get('alertname', 'Unknown')}")
+    
+    key = _alert_key(alert)
+    result = None
+    try:
+        # Analyze the alert
+        result = await analyzer.analyze_alert(alert)
+        
+        if result:
+            # Send notification
+            alert_context = {
+                "instance": alert.labels.get("instance"),
+                "generator_url": alert.generatorURL
+            }
+            notification_sent = await notifier.send_analysis(result, alert_context)
+            
+            if notification_sent:
+                logger.info(f"Successfully analyzed and notified for: {result.alert_name}")
+            else:
+                logger.warning(f"Analysis completed but notification failed for: {result.alert_name}")
+        else:
+            logger.error(f"Analysis failed for alert: {alert.labels.get('alertname', 'Unknown')}")
+            
+    except Exception as e:
+        logger.error(f"Error processing alert: {e}", exc_info=True)
+    
+    finally:
+        # Release waiters on this alert and mark task as done
+        _finish_inflight(key, result)
+        alert_queue.task_done()
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -226,14 +475,25 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     
+    # uvloop/httptools come with uvicorn[standard] but have no Windows wheels;
+    # use them whenever they are importable instead of failing at startup
+    has_uvloop = importlib.util.find_spec("uvloop") is not None
+    has_httptools = importlib.util.find_spec("httptools") is not None
+    if not has_uvloop:
+        logger.warning("uvloop is not installed, using the default asyncio event loop")
+    
     uvicorn.run(
         "app:app",
         host=settings.api_host,
         port=settings.api_port,
         reload=False,
-        log_level="info"
+        log_level="info",
+        loop="uvloop" if has_uvloop else "asyncio",
+        http="httptools" if has_httptools else "h11",
+        workers=settings.api_workers
     )
 
 
@@ -1,12 +1,377 @@
+import asyncio
+import copy
 import httpx
-import logging
+import hashlib
+import io
 import json
-from typing import Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+import logging
+import math
+import re
+import statistics
+import zlib
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from cachetools import TTLCache
+from pydantic import BaseModel, ValidationError
+from tenacity import (
+    retry,
+    retry_if_exception,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
+from clients.http import create_http_client, decode_json, parse_json, request_timeout
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Static instructions and output schema sent as the system message. They must
+# stay byte-identical across requests (no timestamps or alert data) so the
+# provider can reuse its KV cache for these prefixes. The schema of one
+# analysis is shared by the single-alert and batched prefixes.
+_RESPONSE_FORMAT = """**REQUIRED JSON FORMAT:**
+{
+  "summary": "Brief 2-3 sentence summary of the incident",
+  "root_cause": "Most likely root cause based on available data",
+  "evidence": ["Evidence point 1", "Evidence point 2", "Evidence point 3"],
+  "remediation_steps": ["Step 1: Immediate action", "Step 2: Short-term fix", "Step 3: Long-term solution"],
+  "severity_assessment": "Critical/High/Medium/Low - Justification",
+  "confidence": 0.85
+}"""
+
+_SYSTEM_PREFIX = """You are an expert SRE analyzing incidents. Respond ONLY with valid JSON. Do not include any thinking process, explanations, or text outside the JSON object.
+
+The user message contains a production alert with the related metrics and logs. Analyze it and respond with ONLY a JSON object (no extra text, no thinking process).
+
+""" + _RESPONSE_FORMAT
+
+# System message for batched requests, whose answer is an array of analyses
+_BATCH_SYSTEM_PREFIX = """You are an expert SRE analyzing incidents. Respond ONLY with valid JSON. Do not include any thinking process, explanations, or text outside the JSON array.
+
+The user message contains several independent production alerts with their related metrics and logs. Analyze each one and respond with ONLY a JSON array holding one object per alert, in order (no extra text, no thinking process). Every array element uses the format below.
+
+""" + _RESPONSE_FORMAT
+
+# Per-alert user message, filled with str.format_map
+_PROMPT_TEMPLATE = """**ALERT INFORMATION:**
+- Alert Name: {alert_name}
+- Severity: {severity}
+- Summary: {summary}
+- Description: {description}
+- Labels:
+{labels}
+
+**METRICS DATA:**
+{metrics_summary}
+
+**LOG DATA:**
+{logs_summary}"""
+
+# Closing instruction for single-alert requests (dropped when batching)
+_SINGLE_RESPONSE_INSTRUCTION = "\n\nRespond ONLY with the JSON object:"
+
+# Full single-alert template, joined once at import so each prompt is one format_map
+_SINGLE_PROMPT_TEMPLATE = _PROMPT_TEMPLATE + _SINGLE_RESPONSE_INSTRUCTION
+
+# Wrapper used when several alerts are analyzed in one request
+_BATCH_PROMPT_HEADER = """The following {count} alerts are independent. Analyze each one separately and respond with ONLY a JSON array of exactly {count} objects, one per alert in the same order, each in the required JSON format."""
+
+
+@lru_cache(maxsize=512)
+def _render_labels(label_items: Tuple[Tuple[str, str], ...]) -> str:
+    """Render alert labels as indented "key: value" lines, memoized per label set"""
+    return "\n".join(f"  {k}: {v}" for k, v in label_items)
+
+
+# Fields every analysis must carry, and those that must be lists
+_REQUIRED_FIELDS = ("summary", "root_cause", "evidence", "remediation_steps", "severity_assessment")
+_LIST_FIELDS = ("evidence", "remediation_steps")
+
+
+class _LLMAnalysis(BaseModel):
+    """Expected shape of the LLM's JSON answer, with defaults for missing fields"""
+    summary: str = "Not provided"
+    root_cause: str = "Not provided"
+    evidence: List[str] = ["Not provided"]
+    remediation_steps: List[str] = ["Not provided"]
+    severity_assessment: str = "Not provided"
+    confidence: float = 0.75
+
+
+# Only these HTTP statuses are transient; other errors (401, 400, ...) fail fast
+_RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Upper bound on how long a Retry-After header may stall a worker
+_MAX_RETRY_AFTER_SECONDS = 30.0
+
+
+def _is_retryable_status(exc: BaseException) -> bool:
+    """Check whether an exception is an HTTP error worth retrying"""
+    return (
+        isinstance(exc, httpx.HTTPStatusError)
+        and exc.response.status_code in _RETRYABLE_STATUS_CODES
+    )
+
+
+# Series with at least this many points also get min/max/stddev
+_SERIES_STATS_MIN_POINTS = 10
+
+
+def _compact_number(value: Any) -> str:
+    """Render a Prometheus sample value with 4 significant digits"""
+    try:
+        return f"{float(value):.4g}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _summarize_series(values: List[List[Any]]) -> str:
+    """
+    Summarize a Prometheus range series in one compact line
+    
+    Args:
+        values: [[timestamp, value], ...] samples
+    
+    Returns:
+        "first,mid,last n=N" plus min/max/sd for longer series
+    """
+    first_val = _compact_number(values[0][1])
+    mid_val = _compact_number(values[len(values) // 2][1])
+    last_val = _compact_number(values[-1][1])
+    summary = f"{first_val},{mid_val},{last_val} n={len(values)}"
+    
+    if len(values) >= _SERIES_STATS_MIN_POINTS:
+        try:
+            numbers = [float(v[1]) for v in values]
+        except (TypeError, ValueError):
+            return summary
+        # Prometheus returns NaN/±Inf (e.g. 0/0 ratios, histogram_quantile),
+        # which pstdev cannot handle and which would skew min/max anyway
+        numbers = [n for n in numbers if math.isfinite(n)]
+        if not numbers:
+            return summary
+        summary += (
+            f" min={min(numbers):.4g} max={max(numbers):.4g}"
+            f" sd={statistics.pstdev(numbers):.4g}"
+        )
+    
+    return summary
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# A log line whose checksum is divisible by this closes a content-defined
+# block, giving blocks of ~8 lines on average
+_LOG_BLOCK_MODULUS = 8
+
+# Hex digits of a repeated log block's content hash shown as its [ref:id]
+_LOG_BLOCK_LABEL_WIDTH = 6
+
+
+def _format_log_timestamp(entry: Dict[str, Any]) -> str:
+    """Render a log entry's raw Loki nanosecond timestamp as ISO format"""
+    timestamp_ns = entry.get("timestamp_ns")
+    if timestamp_ns is None:
+        return entry.get("timestamp", "")
+    return datetime.fromtimestamp(int(timestamp_ns) / 1e9).isoformat()
+
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+
+def _strip_reasoning(text: str) -> str:
+    """
+    Drop DeepSeek R1 reasoning from a completion
+    
+    R1-distill models often emit only the closing </think> tag, so everything
+    up to the last closing tag is treated as reasoning.
+    """
+    think_end = text.rfind(_THINK_CLOSE)
+    if think_end == -1:
+        return text
+    return text[think_end + len(_THINK_CLOSE):]
+
+
+def _is_analysis(value: Any) -> bool:
+    """Check whether a decoded JSON value carries every required analysis field"""
+    return isinstance(value, dict) and all(field in value for field in _REQUIRED_FIELDS)
+
+
+class _JsonObjectScanner:
+    """
+    Incrementally tracks bracket depth of streamed text to detect when the
+    answer's JSON object (or array, for batched requests) is complete
+    
+    Reasoning is ignored: everything up to a </think> tag (with or without an
+    opening <think>), and anything inside an unterminated <think> block.
+    Only the expected opener starts a candidate, and a balanced candidate
+    that does not decode to a full analysis (or, for a batch of N alerts,
+    an array of exactly N analyses) is skipped rather than ending the scan,
+    e.g. a PromQL selector, a list of sample values or a draft answer in
+    untagged reasoning. Once complete, the exact JSON text is available as
+    json_text.
+    """
+    
+    def __init__(self, batch_size: Optional[int] = None):
+        self._opener = "{" if batch_size is None else "["
+        self._batch_size = batch_size
+        self._buffer = ""
+        self._pos = 0
+        self._reasoning_end = 0
+        self._start = -1
+        self._end = -1
+        self._reset_candidate()
+    
+    def _reset_candidate(self):
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+    
+    def feed(self, text: str) -> bool:
+        """
+        Add streamed text
+        
+        Returns:
+            True once the complete answer JSON value has been seen
+        """
+        if self._end != -1:
+            return True
+        
+        self._buffer += text
+        
+        # Everything up to the latest </think> is reasoning; restart after it
+        think_end = self._buffer.rfind(_THINK_CLOSE)
+        if think_end != -1 and think_end + len(_THINK_CLOSE) > self._reasoning_end:
+            self._reasoning_end = think_end + len(_THINK_CLOSE)
+            self._pos = self._reasoning_end
+            self._reset_candidate()
+        
+        # Still inside an opened reasoning block; wait for its closing tag
+        if self._buffer.find(_THINK_OPEN, self._reasoning_end) != -1:
+            return False
+        
+        while self._pos < len(self._buffer):
+            char = self._buffer[self._pos]
+            self._pos += 1
+            
+            if not self._started:
+                if char == self._opener:
+                    self._started = True
+                    self._start = self._pos - 1
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._is_answer(self._buffer[self._start:self._pos]):
+                        self._end = self._pos
+                        return True
+                    # Not the answer; look for the next candidate after its opener
+                    self._pos = self._start + 1
+                    self._reset_candidate()
+        
+        return False
+    
+    def _is_answer(self, candidate: str) -> bool:
+        """Check whether a balanced candidate decodes to the expected answer"""
+        try:
+            value = parse_json(candidate)
+        except ValueError:
+            return False
+        
+        if self._batch_size is None:
+            return _is_analysis(value)
+        return (
+            isinstance(value, list)
+            and len(value) == self._batch_size
+            and all(_is_analysis(item) for item in value)
+        )
+    
+    @property
+    def text(self) -> str:
+        """All text fed so far"""
+        return self._buffer
+    
+    @property
+    def json_text(self) -> Optional[str]:
+        """The complete answer JSON value, or None if not seen yet"""
+        if self._end == -1:
+            return None
+        return self._buffer[self._start:self._end]
+
+
+def _split_log_blocks(lines: List[str]) -> List[Tuple[str, ...]]:
+    """
+    Split formatted log lines into content-defined blocks
+    
+    Boundaries depend only on line content, so the same run of lines yields
+    the same blocks regardless of where it starts in a query's results.
+    
+    Args:
+        lines: Formatted log lines
+    
+    Returns:
+        List of blocks, each a tuple of lines
+    """
+    blocks = []
+    current = []
+    for line in lines:
+        current.append(line)
+        if zlib.crc32(line.encode()) % _LOG_BLOCK_MODULUS == 0:
+            blocks.append(tuple(current))
+            current = []
+    if current:
+        blocks.append(tuple(current))
+    
+    return blocks
+
+
+def _label_log_blocks(blocks: List[Tuple[str, ...]]) -> Dict[Tuple[str, ...], str]:
+    """
+    Assign short, unique [ref:id] labels to distinct log blocks
+    
+    Labels are a short content hash, widened for any block whose prefix is
+    already taken, so two different blocks never share a label.
+    
+    Args:
+        blocks: Distinct log blocks
+    
+    Returns:
+        Mapping of block to label
+    """
+    labels = {}
+    taken = set()
+    for block in blocks:
+        digest = hashlib.sha1("\n".join(block).encode()).hexdigest()
+        width = _LOG_BLOCK_LABEL_WIDTH
+        label = digest[:width]
+        while label in taken and width < len(digest):
+            width += 1
+            label = digest[:width]
+        # Identical digests for different content: disambiguate with a suffix
+        suffix = 1
+        while label in taken:
+            suffix += 1
+            label = f"{digest[:width]}-{suffix}"
+        taken.add(label)
+        labels[block] = label
+    
+    return labels
+
 
 class DeepSeekClient:
     """
@@ -20,7 +385,13 @@ class DeepSeekClient:
     - distill-llama-8b_46e6iu (8B - Faster)
     """
     
-    def __init__(self, api_key: str = None, api_url: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        api_url: str = None,
+        model: str = None,
+        http_client: httpx.AsyncClient = None
+    ):
         """
         Initialize the Huawei Cloud DeepSeek client
         
@@ -28,6 +399,7 @@ class DeepSeekClient:
             api_key: Huawei API key (X-Auth-Token)
             api_url: Huawei API endpoint URL
             model: Model name to use
+            http_client: Shared HTTP client (a private one is created if omitted)
         """
         self.api_key = api_key or settings.huawei_api_key
         self.api_url = api_url or settings.huawei_api_url
@@ -37,6 +409,56 @@ class DeepSeekClient:
         self.max_tokens = settings.llm_max_tokens
         self.top_p = settings.llm_top_p
         self.top_k = settings.llm_top_k
+        self.stream = settings.llm_stream
+        
+        # Long-lived client so keep-alive connections are reused across alerts
+        # and retries instead of paying a TCP+TLS handshake per request
+        self._owns_client = http_client is None
+        self._client = http_client or create_http_client(self.timeout)
+        self._request_timeout = request_timeout(self.timeout)
+        
+        # Build headers according to Huawei Cloud API specification
+        # Use Bearer token authentication (tested and working)
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        # Request fields that never change between calls; only messages vary
+        self._base_payload = {
+            "model": self.model,  # e.g., "deepseek-r1-distil-qwen-32b_raziqt"
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "stream": self.stream
+        }
+        
+        # Concurrent analyses arriving within a short window are sent to the
+        # LLM together as one request (batch size 1 disables batching)
+        self.batch_max_size = settings.llm_batch_max_size
+        self.batch_max_wait = settings.llm_batch_max_wait_ms / 1000
+        self.batch_max_tokens = settings.llm_batch_max_tokens
+        self._batch_pending: List[Tuple[str, asyncio.Future]] = []
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: set = set()
+        
+        # Parsed analyses keyed by a hash of the exact prompt and sampling
+        # params, so identical requests skip the API call and parsing entirely
+        self._response_cache: Optional[TTLCache] = None
+        if settings.llm_response_cache_ttl > 0:
+            self._response_cache = TTLCache(
+                maxsize=settings.llm_response_cache_size,
+                ttl=settings.llm_response_cache_ttl
+            )
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Futures for analyses currently running, keyed like the response cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Caps concurrent requests to the provider; retries back off outside it
+        self._llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
         
         # Validate configuration
         if not self.api_key:
@@ -46,10 +468,6 @@ class DeepSeekClient:
             logger.info(f"API endpoint: {self.api_url}")
             logger.info(f"Timeout: {self.timeout}s, Temperature: {self.temperature}")
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     async def analyze_alert(
         self,
         alert_context: Dict[str, Any],
@@ -68,15 +486,230 @@ class DeepSeekClient:
             Analysis result as a dictionary
         """
         prompt = self._build_analysis_prompt(alert_context, metrics_data, logs_data)
-        system_prompt = "You are an expert SRE analyzing incidents. Respond ONLY with valid JSON. Do not include any thinking process, explanations, or text outside the JSON object."
+        system_prompt = _SYSTEM_PREFIX
         
         try:
-            response = await self._call_api(prompt, system_prompt)
-            return self._parse_analysis_response(response)
+            cache_key = self._prompt_cache_key(prompt, system_prompt)
+            cached = self._get_cached_analysis(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Single-flight: an identical prompt already being analyzed is
+            # awaited instead of sent to the LLM again
+            inflight = self._inflight.get(cache_key)
+            if inflight is not None:
+                logger.info("Identical analysis already in flight, waiting for its result")
+                shared = await asyncio.shield(inflight)
+                return copy.deepcopy(shared) if shared is not None else None
+            
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[cache_key] = future
+            result = None
+            try:
+                if self.batch_max_size > 1:
+                    result = await self._analyze_in_batch(prompt)
+                else:
+                    response = await self._call_api(prompt, system_prompt)
+                    result = self._parse_analysis_response(response)
+                
+                # Parse failures are not cached so the next identical alert retries
+                if self._response_cache is not None and not result.get("parse_failed"):
+                    self._response_cache[cache_key] = copy.deepcopy(result)
+            finally:
+                # Waiters get None if this call failed or was cancelled
+                del self._inflight[cache_key]
+                future.set_result(copy.deepcopy(result))
+            return result
         except Exception as e:
             logger.error(f"Error analyzing alert with Huawei Cloud LLM: {e}")
             return None
     
+    async def _analyze_in_batch(self, prompt: str) -> Dict[str, Any]:
+        """
+        Queue a prompt for the next batched LLM request and wait for its analysis
+        
+        The batch is sent when it reaches batch_max_size prompts or
+        batch_max_wait seconds after its first prompt arrived.
+        
+        Args:
+            prompt: Per-alert user prompt
+        
+        Returns:
+            Parsed analysis for this prompt
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch_pending.append((prompt, future))
+        
+        if len(self._batch_pending) >= self.batch_max_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(self.batch_max_wait, self._flush_batch)
+        
+        return await future
+    
+    def _flush_batch(self):
+        """Send all pending prompts as one background batch request"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        
+        batch, self._batch_pending = self._batch_pending, []
+        if not batch:
+            return
+        
+        # Keep a reference so the task is not garbage collected mid-flight
+        task = asyncio.create_task(self._run_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Analyze a batch of prompts and resolve each caller's future"""
+        prompts = [prompt for prompt, _ in batch]
+        
+        if len(prompts) > 1:
+            results = await self._analyze_batch_prompts(prompts)
+        else:
+            results = await self._analyze_prompts_individually(prompts)
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def _analyze_batch_prompts(self, prompts: List[str]) -> List[Any]:
+        """
+        Analyze several prompts with a single LLM request
+        
+        A transient failure (transport error, timeout, 429/5xx) that outlasts
+        the retries fails the whole batch instead of being repeated per
+        prompt. Other errors, such as a 400/413 for a batch exceeding the
+        model's context or token limit, and answers that cannot be split back
+        into one analysis per prompt fall back to one request per prompt.
+        
+        Args:
+            prompts: Per-alert user prompts
+        
+        Returns:
+            List of analyses (or exceptions), in prompt order
+        """
+        logger.info(f"Analyzing {len(prompts)} alerts in one batched LLM request")
+        
+        try:
+            response = await self._call_api(
+                self._build_batch_prompt(prompts),
+                _BATCH_SYSTEM_PREFIX,
+                max_tokens=min(self.max_tokens * len(prompts), self.batch_max_tokens),
+                batch_size=len(prompts)
+            )
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            logger.error(f"Batched LLM request failed: {e}")
+            return [e] * len(prompts)
+        except httpx.HTTPStatusError as e:
+            if _is_retryable_status(e):
+                logger.error(f"Batched LLM request failed: {e}")
+                return [e] * len(prompts)
+            logger.warning(f"Batched LLM request rejected ({e.response.status_code}), analyzing alerts individually")
+            return await self._analyze_prompts_individually(prompts)
+        except Exception as e:
+            logger.error(f"Batched LLM request failed: {e}")
+            return [e] * len(prompts)
+        
+        results = self._parse_batch_response(response, len(prompts))
+        if results is not None:
+            return results
+        
+        logger.warning("Batched LLM response could not be split, analyzing alerts individually")
+        return await self._analyze_prompts_individually(prompts)
+    
+    async def _analyze_prompts_individually(self, prompts: List[str]) -> List[Any]:
+        """Analyze each prompt with its own LLM request, concurrently"""
+        async def analyze_one(prompt: str) -> Dict[str, Any]:
+            response = await self._call_api(prompt, _SYSTEM_PREFIX)
+            return self._parse_analysis_response(response)
+        
+        return await asyncio.gather(
+            *(analyze_one(prompt) for prompt in prompts),
+            return_exceptions=True
+        )
+    
+    def _build_batch_prompt(self, prompts: List[str]) -> str:
+        """Combine per-alert prompts into one request asking for a JSON array"""
+        sections = [_BATCH_PROMPT_HEADER.format(count=len(prompts))]
+        for i, prompt in enumerate(prompts, 1):
+            sections.append(f"### ALERT {i}\n{prompt.removesuffix(_SINGLE_RESPONSE_INSTRUCTION)}")
+        sections.append(f"Respond ONLY with the JSON array of {len(prompts)} objects:")
+        
+        return "\n\n".join(sections)
+    
+    def _parse_batch_response(self, response: str, count: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Parse a batched LLM response into one analysis per alert
+        
+        Args:
+            response: Raw LLM response expected to contain a JSON array
+            count: Number of alerts in the batch
+        
+        Returns:
+            List of analyses, or None if the response does not match the batch
+        """
+        response = _strip_reasoning(response)
+        start_idx = response.find('[')
+        end_idx = response.rfind(']')
+        if start_idx == -1 or end_idx == -1:
+            return None
+        
+        try:
+            items = parse_json(response[start_idx:end_idx + 1])
+        except json.JSONDecodeError:
+            return None
+        
+        if not isinstance(items, list) or len(items) != count:
+            return None
+        if not all(isinstance(item, dict) for item in items):
+            return None
+        
+        results = []
+        for item in items:
+            try:
+                results.append(_LLMAnalysis.model_validate(item).model_dump())
+            except ValidationError:
+                results.append(self._normalize_analysis(item))
+        
+        return results
+    
+    def _prompt_cache_key(self, prompt: str, system_prompt: str) -> str:
+        """Build a cache key from the final prompt and the model parameters"""
+        raw = "\x1f".join([
+            system_prompt,
+            prompt,
+            self.model,
+            str(self.temperature),
+            str(self.max_tokens),
+            str(self.top_p),
+            str(self.top_k)
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def _get_cached_analysis(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Look up a previous parsed analysis for the prompt, tracking hit/miss counts"""
+        if self._response_cache is None:
+            return None
+        
+        result = self._response_cache.get(cache_key)
+        if result is None:
+            self.cache_misses += 1
+            logger.info(f"LLM response cache miss (hits: {self.cache_hits}, misses: {self.cache_misses})")
+            return None
+        
+        self.cache_hits += 1
+        logger.info(f"LLM response cache hit (hits: {self.cache_hits}, misses: {self.cache_misses})")
+        # Callers may mutate the result; keep the cached copy pristine
+        return copy.deepcopy(result)
+    
     def _build_analysis_prompt(
         self,
         alert_context: Dict[str, Any],
@@ -84,7 +717,7 @@ class DeepSeekClient:
         logs_data: Dict[str, Any]
     ) -> str:
         """
-        Build a comprehensive prompt for alert analysis
+        Build the per-alert user message for analysis (instructions live in _SYSTEM_PREFIX)
         
         Args:
             alert_context: Alert information
@@ -107,94 +740,144 @@ class DeepSeekClient:
         # Format logs for the prompt
         logs_summary = self._format_logs_for_prompt(logs_data)
         
-        prompt = f"""Analyze this production alert and respond with ONLY a JSON object (no extra text, no thinking process).
-
-**ALERT INFORMATION:**
-- Alert Name: {alert_name}
-- Severity: {severity}
-- Summary: {summary}
-- Description: {description}
-- Labels: {json.dumps(labels, indent=2)}
-
-**METRICS DATA:**
-{metrics_summary}
-
-**LOG DATA:**
-{logs_summary}
-
-**REQUIRED JSON FORMAT:**
-{{
-  "summary": "Brief 2-3 sentence summary of the incident",
-  "root_cause": "Most likely root cause based on available data",
-  "evidence": ["Evidence point 1", "Evidence point 2", "Evidence point 3"],
-  "remediation_steps": ["Step 1: Immediate action", "Step 2: Short-term fix", "Step 3: Long-term solution"],
-  "severity_assessment": "Critical/High/Medium/Low - Justification",
-  "confidence": 0.85
-}}
-
-Respond ONLY with the JSON object:"""
-        
-        return prompt
+        return _SINGLE_PROMPT_TEMPLATE.format_map({
+            "alert_name": alert_name,
+            "severity": severity,
+            "summary": summary,
+            "description": description,
+            "labels": _render_labels(tuple(sorted(labels.items()))),
+            "metrics_summary": metrics_summary,
+            "logs_summary": logs_summary
+        })
     
     def _format_metrics_for_prompt(self, metrics_data: Dict[str, Any]) -> str:
-        """Format metrics data for inclusion in prompt"""
+        """
+        Format metrics data for inclusion in prompt
+        
+        Each series is one compact line: start, middle and end values at 4
+        significant digits, the point count, and min/max/stddev for longer
+        series.
+        """
         if not metrics_data:
             return "No metrics data available."
         
-        formatted = []
+        buf = io.StringIO()
+        buf.write("Series format: labels | start,mid,end n=points [min max sd]")
         for metric_name, results in metrics_data.items():
-            formatted.append(f"\n**{metric_name}:**")
+            buf.write(f"\n\n**{metric_name}:**")
             
             for result in results[:3]:  # Limit to first 3 series per metric
-                metric_labels = result.get("metric", {})
                 values = result.get("values", [])
                 
                 if values:
-                    # Get first, middle, and last values
-                    first_val = values[0][1] if len(values) > 0 else "N/A"
-                    mid_val = values[len(values)//2][1] if len(values) > 1 else first_val
-                    last_val = values[-1][1] if len(values) > 0 else first_val
-                    
-                    labels_str = ", ".join([f"{k}={v}" for k, v in metric_labels.items() if k != "__name__"])
-                    formatted.append(f"  - {labels_str}")
-                    formatted.append(f"    Start: {first_val}, Mid: {mid_val}, End: {last_val} ({len(values)} data points)")
+                    labels_str = ", ".join(
+                        f"{k}={v}" for k, v in result.get("metric", {}).items() if k != "__name__"
+                    )
+                    buf.write(f"\n  - {labels_str} | {_summarize_series(values)}")
         
-        return "\n".join(formatted) if formatted else "No metric results found."
+        return buf.getvalue()
     
     def _format_logs_for_prompt(self, logs_data: Dict[str, Any]) -> str:
-        """Format log data for inclusion in prompt"""
+        """
+        Format log data for inclusion in prompt
+        
+        Log queries for the same alert overlap heavily (e.g. service errors are
+        also in the service's full log stream), so the selected lines are split
+        into content-defined blocks and any block repeated later in the prompt
+        is replaced by a short [ref:id] pointing at its first occurrence.
+        Output stops growing once it reaches settings.max_prompt_bytes.
+        """
         if not logs_data:
             return "No log data available."
         
-        formatted = []
+        sections = []
         total_logs = 0
+        budget = settings.max_prompt_bytes
+        running = 0
+        omitted_queries = 0
         
         for log_query, log_entries in logs_data.items():
             if not log_entries:
                 continue
             
-            formatted.append(f"\n**{log_query}** ({len(log_entries)} entries):")
+            total_logs += len(log_entries)
+            if running >= budget:
+                omitted_queries += 1
+                continue
             
             # Show most relevant logs (first 10)
+            lines = []
             for entry in log_entries[:10]:
-                timestamp = entry.get("timestamp", "")
-                line = entry.get("line", "")
+                timestamp = _format_log_timestamp(entry)
+                # Collapse whitespace runs (indented stack traces, padding)
+                line = _WHITESPACE_RE.sub(" ", entry.get("line", "")).strip()
                 # Truncate very long log lines
                 if len(line) > 200:
                     line = line[:200] + "..."
-                formatted.append(f"  [{timestamp}] {line}")
-            
-            total_logs += len(log_entries)
+                line = f"  [{timestamp}] {line}"
+                lines.append(line)
+                
+                running += len(line) + 1
+                if running >= budget:
+                    break
             
-            if len(log_entries) > 10:
-                formatted.append(f"  ... and {len(log_entries) - 10} more entries")
+            sections.append((log_query, len(log_entries), len(lines), _split_log_blocks(lines)))
         
-        if not formatted:
+        if not sections:
             return "No relevant logs found."
         
-        return "\n".join([f"Total log entries: {total_logs}"] + formatted)
+        # Blocks are identified by their content; the hash is only a label
+        block_counts = Counter(block for _, _, _, blocks in sections for block in blocks)
+        block_labels = _label_log_blocks(
+            [block for block, count in block_counts.items() if count > 1]
+        )
+        
+        buf = io.StringIO()
+        buf.write(f"Total log entries: {total_logs}")
+        if block_labels:
+            buf.write("\n(Lines marked [ref:id] repeat the block first shown under the same id)")
+        
+        seen_blocks = set()
+        for log_query, entry_count, shown_count, blocks in sections:
+            buf.write(f"\n\n**{log_query}** ({entry_count} entries):")
+            
+            for block in blocks:
+                label = block_labels.get(block)
+                if label is not None:
+                    if block in seen_blocks:
+                        buf.write(f"\n  [ref:{label}]")
+                        continue
+                    seen_blocks.add(block)
+                    buf.write(f"\n  [ref:{label}] first shown here:")
+                
+                for line in block:
+                    buf.write("\n")
+                    buf.write(line)
+            
+            if entry_count > shown_count:
+                buf.write(f"\n  ... and {entry_count - shown_count} more entries")
+        
+        if omitted_queries:
+            buf.write(f"\n\n... {omitted_queries} more log queries omitted (prompt size limit)")
+        
+        return buf.getvalue()
     
-    async def _call_api(self, prompt: str, system_prompt: str = None) -> str:
+    @retry(
+        retry=(
+            retry_if_exception_type((httpx.TransportError, httpx.TimeoutException))
+            | retry_if_exception(_is_retryable_status)
+        ),
+        wait=wait_exponential_jitter(initial=1, max=30, jitter=2),
+        stop=stop_after_attempt(settings.llm_max_retries),
+        reraise=True
+    )
+    async def _call_api(
+        self,
+        prompt: str,
+        system_prompt: str = None,
+        max_tokens: int = None,
+        batch_size: Optional[int] = None
+    ) -> str:
         """
         Call the Huawei Cloud DeepSeek API
         
@@ -206,6 +889,12 @@ Respond ONLY with the JSON object:"""
         Args:
             prompt: The user prompt to send
             system_prompt: Optional system prompt to set behavior
+            max_tokens: Override for the completion token limit
+            batch_size: Number of alerts when the answer is a batched JSON array
+        
+        Transport errors, timeouts, 429 and 5xx gateway/server responses are
+        retried with jittered exponential backoff; other 4xx errors are raised
+        immediately.
         
         Returns:
             API response text
@@ -213,13 +902,6 @@ Respond ONLY with the JSON object:"""
         if not self.api_key:
             raise ValueError("Huawei API key is not configured. Please set HUAWEI_API_KEY environment variable.")
         
-        # Build headers according to Huawei Cloud API specification
-        # Use Bearer token authentication (tested and working)
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
         # Build messages array
         messages = []
         if system_prompt:
@@ -233,49 +915,30 @@ Respond ONLY with the JSON object:"""
         })
         
         # Build payload according to Huawei Cloud API specification
-        payload = {
-            "model": self.model,  # e.g., "deepseek-r1-distil-qwen-32b_raziqt"
-            "messages": messages,
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature,
-            "top_p": self.top_p,
-            "top_k": self.top_k,
-            "stream": False  # Non-streaming mode for simplicity
-        }
+        payload = {**self._base_payload, "messages": messages}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
         
         logger.info(f"Calling Huawei Cloud API with model: {self.model}")
-        logger.info(f"Request parameters - Temperature: {self.temperature}, Max Tokens: {self.max_tokens}")
+        logger.info(f"Request parameters - Temperature: {self.temperature}, Max Tokens: {payload['max_tokens']}")
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                # Parse response according to OpenAI-compatible format
-                data = response.json()
-                
-                # Extract content from response
-                # Response format: data['choices'][0]['message']['content']
-                if "choices" in data and len(data["choices"]) > 0:
-                    content = data["choices"][0]["message"]["content"]
-                    logger.info(f"Successfully received response from Huawei Cloud API ({len(content)} characters)")
-                    
-                    # Log token usage if available
-                    if "usage" in data:
-                        usage = data["usage"]
-                        logger.info(f"Token usage - Prompt: {usage.get('prompt_tokens')}, "
-                                  f"Completion: {usage.get('completion_tokens')}, "
-                                  f"Total: {usage.get('total_tokens')}")
-                    
-                    return content
+            async with self._llm_semaphore:
+                if self.stream:
+                    content, usage = await self._stream_completion(payload, batch_size)
                 else:
-                    logger.error(f"Unexpected response format: {data}")
-                    raise ValueError("Invalid response format from Huawei Cloud API")
-                    
+                    content, usage = await self._fetch_completion(payload)
+            
+            logger.info(f"Successfully received response from Huawei Cloud API ({len(content)} characters)")
+            
+            # Log token usage if available
+            if usage:
+                logger.info(f"Token usage - Prompt: {usage.get('prompt_tokens')}, "
+                          f"Completion: {usage.get('completion_tokens')}, "
+                          f"Total: {usage.get('total_tokens')}")
+            
+            return content
+                
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error from Huawei Cloud API: {e.response.status_code}")
             logger.error(f"Response body: {e.response.text}")
@@ -283,9 +946,12 @@ Respond ONLY with the JSON object:"""
             if e.response.status_code == 401:
                 raise ValueError("Authentication failed. Please check your HUAWEI_API_KEY.")
             elif e.response.status_code == 429:
-                raise ValueError("Rate limit exceeded. Please wait before retrying.")
-            elif e.response.status_code == 503:
-                raise ValueError("Huawei Cloud API service unavailable. Please try again later.")
+                logger.warning("Rate limit exceeded, retrying")
+                await self._wait_retry_after(e.response)
+                raise
+            elif e.response.status_code in _RETRYABLE_STATUS_CODES:
+                logger.warning("Huawei Cloud API service unavailable, retrying")
+                raise
             else:
                 raise
         except httpx.TimeoutException:
@@ -296,6 +962,132 @@ Respond ONLY with the JSON object:"""
             logger.error(f"Unexpected error calling Huawei Cloud API: {e}")
             raise
     
+    async def _wait_retry_after(self, response: httpx.Response):
+        """Sleep for the delay requested by a Retry-After header, if any"""
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return
+        
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            # HTTP-date form is not worth parsing; fall back to backoff
+            return
+        
+        await asyncio.sleep(min(max(delay, 0.0), _MAX_RETRY_AFTER_SECONDS))
+    
+    async def _fetch_completion(self, payload: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Send a non-streaming request and return the completion text and token usage
+        
+        Args:
+            payload: Chat completion request payload
+        
+        Returns:
+            Tuple of (content, usage)
+        """
+        response = await self._client.post(
+            self.api_url,
+            headers=self._headers,
+            json=payload,
+            timeout=self._request_timeout
+        )
+        response.raise_for_status()
+        
+        # Parse response according to OpenAI-compatible format
+        data = decode_json(response)
+        
+        # Extract content from response
+        # Response format: data['choices'][0]['message']['content']
+        if "choices" in data and len(data["choices"]) > 0:
+            return data["choices"][0]["message"]["content"], data.get("usage")
+        
+        logger.error(f"Unexpected response format: {data}")
+        raise ValueError("Invalid response format from Huawei Cloud API")
+    
+    async def _stream_completion(
+        self,
+        payload: Dict[str, Any],
+        batch_size: Optional[int] = None
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Send a streaming request and accumulate the completion from SSE frames
+        
+        Reading stops as soon as the answer's JSON value is complete and
+        decodes, so any trailing text the model generates after it is never
+        waited for.
+        
+        Args:
+            payload: Chat completion request payload
+            batch_size: Number of alerts when the answer is a batched JSON array
+        
+        Returns:
+            Tuple of (content, usage)
+        """
+        usage = None
+        scanner = _JsonObjectScanner(batch_size)
+        
+        async with self._client.stream(
+            "POST",
+            self.api_url,
+            headers=self._headers,
+            json=payload,
+            timeout=self._request_timeout
+        ) as response:
+            if response.is_error:
+                # Load the body so the error handler can log it
+                await response.aread()
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = parse_json(data)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if scanner.feed(delta):
+                    logger.info("Analysis JSON complete, closing stream early")
+                    break
+        
+        if not scanner.text:
+            raise ValueError("Invalid response format from Huawei Cloud API")
+        
+        # Hand back just the JSON value located while streaming; parsing then
+        # cannot be confused by braces in reasoning text before it
+        return scanner.json_text or scanner.text, usage
+    
+    def _normalize_analysis(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fill in missing fields and coerce list fields of a decoded analysis
+        
+        Args:
+            result: Decoded JSON object from the LLM
+        
+        Returns:
+            Analysis dictionary with all expected fields
+        """
+        # Ensure all required fields are present
+        for field in _REQUIRED_FIELDS:
+            result.setdefault(field, "Not provided")
+        
+        # Ensure lists are lists
+        for field in _LIST_FIELDS:
+            value = result[field]
+            result[field] = value if isinstance(value, list) else [str(value)]
+        
+        # Add confidence if not present
+        result.setdefault("confidence", 0.75)
+        
+        return result
+    
     def _parse_analysis_response(self, response: str) -> Dict[str, Any]:
         """
         Parse the LLM response into a structured format
@@ -312,7 +1104,7 @@ Respond ONLY with the JSON object:"""
         try:
             # DeepSeek R1 models may include thinking process in <think> tags
             # Remove everything before the first { and after the last }
-            clean_response = response.strip()
+            clean_response = _strip_reasoning(response).strip()
             
             # Find the JSON object (starts with { and ends with })
             start_idx = clean_response.find('{')
@@ -321,27 +1113,15 @@ Respond ONLY with the JSON object:"""
             if start_idx != -1 and end_idx != -1:
                 clean_response = clean_response[start_idx:end_idx + 1]
             
-            # Try to parse as JSON
-            result = json.loads(clean_response)
+            # Happy path: parse and validate in a single pydantic-core pass
+            try:
+                return _LLMAnalysis.model_validate_json(clean_response).model_dump()
+            except ValidationError:
+                # Invalid JSON or unexpected field types; repair below
+                pass
             
-            # Ensure all required fields are present
-            required_fields = ["summary", "root_cause", "evidence", "remediation_steps", "severity_assessment"]
-            for field in required_fields:
-                if field not in result:
-                    result[field] = f"Not provided"
-            
-            # Ensure lists are lists
-            if not isinstance(result.get("evidence"), list):
-                result["evidence"] = [str(result.get("evidence", ""))]
-            
-            if not isinstance(result.get("remediation_steps"), list):
-                result["remediation_steps"] = [str(result.get("remediation_steps", ""))]
-            
-            # Add confidence if not present
-            if "confidence" not in result:
-                result["confidence"] = 0.75
-            
-            return result
+            # Try to parse as JSON
+            return self._normalize_analysis(parse_json(clean_response))
             
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse LLM response as JSON: {e}")
@@ -358,7 +1138,11 @@ Respond ONLY with the JSON object:"""
                     "Contact the on-call engineer"
                 ],
                 "severity_assessment": "Unknown - Manual review required",
-                "confidence": 0.0
+                "confidence": 0.0,
+                "parse_failed": True
             }
-
-
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool if this client created it"""
+        if self._owns_client:
+            await self._client.aclose()
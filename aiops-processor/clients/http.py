@@ -0,0 +1,136 @@
+import asyncio
+import httpx
+import json
+import logging
+from typing import Any, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Single JSON codec for all upstreams: Prometheus/Loki range responses are
+# large nested arrays and the LLM client decodes every streamed chunk, and
+# orjson is several times faster than the stdlib decoder httpx uses
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+# Header for request bodies posted as pre-encoded JSON
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def request_timeout(timeout: float) -> httpx.Timeout:
+    """
+    Build a request timeout whose connect phase is capped at 10 seconds
+    
+    Fails fast on unreachable hosts even when reads may take minutes (LLM).
+    
+    Args:
+        timeout: Read/write/pool timeout in seconds
+    
+    Returns:
+        httpx.Timeout for a client or a single request
+    """
+    return httpx.Timeout(timeout, connect=min(timeout, 10.0))
+
+
+def create_http_client(timeout: float = 30.0) -> httpx.AsyncClient:
+    """
+    Create a pooled HTTP/2 client for outbound requests
+    
+    A single instance can be shared by the Prometheus, Loki and LLM clients so
+    all of them reuse the same keep-alive connections instead of paying a
+    TCP+TLS handshake per request.
+    
+    Args:
+        timeout: Default request timeout in seconds
+    
+    Returns:
+        Configured httpx.AsyncClient
+    """
+    return httpx.AsyncClient(
+        timeout=request_timeout(timeout),
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=128,
+            max_keepalive_connections=64,
+            # Idle connections outlive alert bursts and the startup warm-up
+            keepalive_expiry=30.0
+        )
+    )
+
+
+async def warm_up_connections(
+    client: httpx.AsyncClient,
+    probes: List[Tuple[str, str]],
+    timeout: float = 3.0
+):
+    """
+    Open pooled connections to upstreams before the first alert arrives
+    
+    Each probe is a cheap request whose only purpose is to complete the TCP,
+    TLS and HTTP/2 handshakes; responses and failures are ignored. Warmed
+    connections are closed after the pool's keepalive_expiry, so this only
+    helps alerts arriving shortly after startup (e.g. AlertManager resending
+    its pending notifications once the processor is back).
+    
+    Args:
+        client: Shared HTTP client whose pool should be warmed
+        probes: (method, url) pairs to request
+        timeout: Per-probe timeout in seconds
+    """
+    async def probe(method: str, url: str):
+        try:
+            response = await client.request(method, url, timeout=timeout)
+            logger.info(f"Warmed connection to {url} ({response.status_code}, {response.http_version})")
+        except Exception as e:
+            logger.warning(f"Connection warmup to {url} failed: {e}")
+    
+    await asyncio.gather(*(probe(method, url) for method, url in probes))
+
+
+def parse_json(data: Union[str, bytes]) -> Any:
+    """
+    Decode a JSON document
+    
+    Raises json.JSONDecodeError on invalid input whether or not orjson is
+    installed (orjson's error subclasses it).
+    
+    Args:
+        data: JSON text or UTF-8 bytes
+    
+    Returns:
+        Decoded JSON value
+    """
+    return _json_loads(data)
+
+
+def decode_json(response: httpx.Response) -> Any:
+    """
+    Decode a JSON response body straight from its raw bytes
+    
+    Args:
+        response: Response whose body has been read
+    
+    Returns:
+        Decoded JSON value
+    """
+    return _json_loads(response.content)
+
+
+def encode_json(obj: Any) -> bytes:
+    """
+    Encode a request body as compact JSON bytes (send with JSON_HEADERS)
+    
+    Args:
+        obj: JSON-serializable value
+    
+    Returns:
+        UTF-8 encoded JSON
+    """
+    return _json_dumps(obj)
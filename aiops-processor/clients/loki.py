@@ -1,18 +1,76 @@
+import asyncio
 import httpx
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
 from datetime import datetime, timedelta
+from clients.http import create_http_client, decode_json
 from config import settings
 
 logger = logging.getLogger(__name__)
 
 
+# Canonical line filters, shared by every query so the strings stay identical
+_ERROR_FILTER = ' |~ "(?i)(error|exception|failed|fatal|critical)"'
+_WARNING_FILTER = ' |~ "(?i)(warn|warning)"'
+
+# LogQL templates; the only per-alert work is one .format() substitution
+_SERVICE_TPL = '{{service="{s}"}}'
+_JOB_TPL = '{{job="{s}"}}'
+_CONTAINER_TPL = '{{container=~".*{s}.*"}}'
+_INSTANCE_TPL = '{{instance=~".*{s}.*"}}'
+_ALL_JOBS = '{job=~".+"}'
+
+
+@lru_cache(maxsize=512)
+def _build_log_queries(service: str, job: str, instance: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Build LogQL queries for an alert source, memoized per (service, job, instance)
+    
+    Returns:
+        Tuple of (query name, LogQL query) pairs
+    """
+    queries = []
+    
+    # Service-specific logs: all, errors and warnings
+    if service:
+        service_selector = _SERVICE_TPL.format(s=service)
+        queries.append(("service_all_logs", service_selector))
+        queries.append(("service_errors", service_selector + _ERROR_FILTER))
+        queries.append(("service_warnings", service_selector + _WARNING_FILTER))
+    
+    # Job-specific logs
+    if job:
+        job_selector = _JOB_TPL.format(s=job)
+        queries.append(("job_logs", job_selector))
+        queries.append(("job_errors", job_selector + _ERROR_FILTER))
+    
+    # Container-specific logs (from Docker)
+    if service:
+        container_selector = _CONTAINER_TPL.format(s=service)
+        queries.append(("container_logs", container_selector))
+        queries.append(("container_errors", container_selector + _ERROR_FILTER))
+    
+    # If we have instance info, try to get system logs
+    if instance:
+        queries.append(("instance_logs", _INSTANCE_TPL.format(s=instance.split(":")[0])))
+    
+    # Generic error patterns if no specific service
+    if not queries:
+        queries.append(("all_errors", _ALL_JOBS + _ERROR_FILTER))
+        queries.append(("all_warnings", _ALL_JOBS + _WARNING_FILTER))
+    
+    return tuple(queries)
+
+
 class LokiClient:
     """Client for querying Loki logs"""
     
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, http_client: httpx.AsyncClient = None):
         self.base_url = base_url or settings.loki_url
         self.timeout = 30.0
+        self._owns_client = http_client is None
+        self._client = http_client or create_http_client(self.timeout)
     
     async def query_range(
         self,
@@ -45,26 +103,26 @@ class LokiClient:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("status") == "success":
-                    return self._parse_loki_response(data)
-                else:
-                    logger.error(f"Loki query failed: {data}")
-                    return []
+            response = await self._client.get(url, params=params)
+            response.raise_for_status()
+            data = decode_json(response)
+            
+            if data.get("status") == "success":
+                return self._parse_loki_response(data, limit)
+            else:
+                logger.error(f"Loki query failed: {data}")
+                return []
         except Exception as e:
             logger.error(f"Error querying Loki: {e}")
             return []
     
-    def _parse_loki_response(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _parse_loki_response(self, response: Dict[str, Any], limit: int = None) -> List[Dict[str, Any]]:
         """
         Parse Loki response into a list of log entries
         
         Args:
             response: Raw Loki API response
+            limit: Stop after this many entries (default: no limit)
         
         Returns:
             List of parsed log entries
@@ -73,12 +131,19 @@ class LokiClient:
         result = response.get("data", {}).get("result", [])
         
         for stream in result:
+            if limit is not None and len(logs) >= limit:
+                break
+            
             stream_labels = stream.get("stream", {})
             values = stream.get("values", [])
+            if limit is not None:
+                values = values[:limit - len(logs)]
             
+            # Keep Loki's raw nanosecond timestamp; only the few lines that make
+            # it into the prompt are ever converted to ISO format
             for timestamp_ns, log_line in values:
                 logs.append({
-                    "timestamp": datetime.fromtimestamp(int(timestamp_ns) / 1e9).isoformat(),
+                    "timestamp_ns": timestamp_ns,
                     "line": log_line,
                     "labels": stream_labels
                 })
@@ -109,11 +174,20 @@ class LokiClient:
         # Build queries based on alert context
         queries = self._build_queries_from_labels(alert_labels)
         
-        results = {}
         for query_name, query in queries.items():
             logger.info(f"Executing log query: {query_name} - {query}")
-            result = await self.query_range(query, start_time, end_time)
-            if result:
+        
+        # Run all queries concurrently; total latency is the slowest query
+        responses = await asyncio.gather(
+            *(self.query_range(query, start_time, end_time) for query in queries.values()),
+            return_exceptions=True
+        )
+        
+        results = {}
+        for query_name, result in zip(queries, responses):
+            if isinstance(result, Exception):
+                logger.error(f"Query {query_name} failed: {result}")
+            elif result:
                 results[query_name] = result
         
         return results
@@ -128,43 +202,11 @@ class LokiClient:
         Returns:
             Dictionary of query names to LogQL queries
         """
-        queries = {}
-        service = labels.get("service", "")
-        job = labels.get("job", "")
-        instance = labels.get("instance", "")
-        
-        # Service-specific logs
-        if service:
-            # All logs for the service
-            queries["service_all_logs"] = f'{{service="{service}"}}'
-            
-            # Error logs
-            queries["service_errors"] = f'{{service="{service}"}} |~ "(?i)(error|exception|fatal|critical)"'
-            
-            # Warning logs
-            queries["service_warnings"] = f'{{service="{service}"}} |~ "(?i)(warn|warning)"'
-        
-        # Job-specific logs
-        if job:
-            queries["job_logs"] = f'{{job="{job}"}}'
-            queries["job_errors"] = f'{{job="{job}"}} |~ "(?i)(error|exception|fatal)"'
-        
-        # Container-specific logs (from Docker)
-        if service:
-            queries["container_logs"] = f'{{container=~".*{service}.*"}}'
-            queries["container_errors"] = f'{{container=~".*{service}.*"}} |~ "(?i)(error|exception|failed|fatal)"'
-        
-        # If we have instance info, try to get system logs
-        if instance:
-            instance_host = instance.split(":")[0]
-            queries["instance_logs"] = f'{{instance=~".*{instance_host}.*"}}'
-        
-        # Generic error patterns if no specific service
-        if not queries:
-            queries["all_errors"] = '{job=~".+"} |~ "(?i)(error|exception|fatal|critical)"'
-            queries["all_warnings"] = '{job=~".+"} |~ "(?i)(warn|warning)"'
-        
-        return queries
+        return dict(_build_log_queries(
+            labels.get("service", ""),
+            labels.get("job", ""),
+            labels.get("instance", "")
+        ))
     
     async def search_logs_by_pattern(
         self,
@@ -198,5 +240,8 @@ class LokiClient:
         query = f'{label_selector} |~ "{pattern}"'
         
         return await self.query_range(query, start_time, end_time, limit)
-
-
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool if this client created it"""
+        if self._owns_client:
+            await self._client.aclose()
@@ -1,25 +1,104 @@
+import asyncio
 import httpx
 import logging
-from typing import List, Dict, Any, Optional
+import math
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from clients.http import create_http_client, decode_json
 from config import settings
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=512)
+def _build_metric_queries(instance: str, job: str, component: str, alertname: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Build PromQL queries for an alert source, memoized per label signature
+    
+    Returns:
+        Tuple of (query name, PromQL query) pairs
+    """
+    # Queries are written in one canonical form (matchers sorted by label
+    # name, "by (...)" spacing as promtool formats it) so the same query text
+    # recurs across alerts and stays hot in Prometheus' caches
+    queries = {}
+    alertname = alertname.lower()
+    
+    # CPU metrics
+    if component == "cpu" or "cpu" in alertname:
+        if instance:
+            queries["cpu_usage"] = f'100 - (avg by (instance) (irate(node_cpu_seconds_total{{instance="{instance}",mode="idle"}}[5m])) * 100)'
+            queries["cpu_by_mode"] = f'irate(node_cpu_seconds_total{{instance="{instance}"}}[5m])'
+        else:
+            queries["cpu_usage"] = '100 - (avg by (instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
+    
+    # Memory metrics
+    if component == "memory" or "memory" in alertname:
+        if instance:
+            queries["memory_usage"] = f'(1 - (node_memory_MemAvailable_bytes{{instance="{instance}"}} / node_memory_MemTotal_bytes{{instance="{instance}"}})) * 100'
+            queries["memory_details"] = f'node_memory_MemAvailable_bytes{{instance="{instance}"}}'
+        else:
+            queries["memory_usage"] = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
+    
+    # Disk metrics
+    if component == "disk" or "disk" in alertname:
+        if instance:
+            queries["disk_usage"] = f'(1 - (node_filesystem_avail_bytes{{fstype!="tmpfs",instance="{instance}"}} / node_filesystem_size_bytes{{fstype!="tmpfs",instance="{instance}"}})) * 100'
+        else:
+            queries["disk_usage"] = '(1 - (node_filesystem_avail_bytes{fstype!="tmpfs"} / node_filesystem_size_bytes{fstype!="tmpfs"})) * 100'
+    
+    # Instance availability
+    if job:
+        queries["instance_up"] = f'up{{job="{job}"}}'
+    elif instance:
+        queries["instance_up"] = f'up{{instance="{instance}"}}'
+    
+    # Load average
+    if instance:
+        queries["load_average"] = f'node_load1{{instance="{instance}"}}'
+    
+    # Network I/O
+    if instance:
+        queries["network_receive"] = f'irate(node_network_receive_bytes_total{{instance="{instance}"}}[5m])'
+        queries["network_transmit"] = f'irate(node_network_transmit_bytes_total{{instance="{instance}"}}[5m])'
+    
+    # Disk I/O
+    if instance:
+        queries["disk_read"] = f'irate(node_disk_read_bytes_total{{instance="{instance}"}}[5m])'
+        queries["disk_write"] = f'irate(node_disk_written_bytes_total{{instance="{instance}"}}[5m])'
+    
+    # If no specific queries were built, add generic queries
+    if not queries:
+        if instance:
+            queries["instance_up"] = f'up{{instance="{instance}"}}'
+            # Get any metrics for this instance
+            queries["all_metrics"] = f'{{instance="{instance}"}}'
+        elif job:
+            queries["job_up"] = f'up{{job="{job}"}}'
+        else:
+            # Last resort - get some metrics
+            queries["up_status"] = 'up'
+    
+    return tuple(queries.items())
+
+
 class PrometheusClient:
     """Client for querying Prometheus metrics"""
     
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, http_client: httpx.AsyncClient = None):
         self.base_url = base_url or settings.prometheus_url
         self.timeout = 30.0
+        self._owns_client = http_client is None
+        self._client = http_client or create_http_client(self.timeout)
     
     async def query_range(
         self,
         query: str,
         start_time: datetime,
         end_time: datetime,
-        step: str = "15s"
+        step: str = None,
+        max_points: int = None
     ) -> List[Dict[str, Any]]:
         """
         Query Prometheus for a range of time-series data
@@ -28,12 +107,18 @@ class PrometheusClient:
             query: PromQL query string
             start_time: Start of time range
             end_time: End of time range
-            step: Query resolution step
+            step: Query resolution step (default derived from max_points)
+            max_points: Maximum samples per series (default from settings)
         
         Returns:
             List of metric results with labels and values
         """
         url = f"{self.base_url}/api/v1/query_range"
+        if step is None:
+            # Let Prometheus down-sample instead of shipping samples we never use
+            points = max_points or settings.max_metrics_points
+            span = (end_time - start_time).total_seconds()
+            step = f"{max(1, math.ceil(span / points))}s"
         params = {
             "query": query,
             "start": int(start_time.timestamp()),
@@ -42,16 +127,15 @@ class PrometheusClient:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("status") == "success":
-                    return data.get("data", {}).get("result", [])
-                else:
-                    logger.error(f"Prometheus query failed: {data}")
-                    return []
+            response = await self._client.get(url, params=params)
+            response.raise_for_status()
+            data = decode_json(response)
+            
+            if data.get("status") == "success":
+                return data.get("data", {}).get("result", [])
+            else:
+                logger.error(f"Prometheus query failed: {data}")
+                return []
         except Exception as e:
             logger.error(f"Error querying Prometheus: {e}")
             return []
@@ -80,11 +164,20 @@ class PrometheusClient:
         # Build queries based on alert context
         queries = self._build_queries_from_labels(alert_labels)
         
-        results = {}
         for query_name, query in queries.items():
             logger.info(f"Executing query: {query_name} - {query}")
-            result = await self.query_range(query, start_time, end_time)
-            if result:
+        
+        # Run all queries concurrently; total latency is the slowest query
+        responses = await asyncio.gather(
+            *(self.query_range(query, start_time, end_time) for query in queries.values()),
+            return_exceptions=True
+        )
+        
+        results = {}
+        for query_name, result in zip(queries, responses):
+            if isinstance(result, Exception):
+                logger.error(f"Query {query_name} failed: {result}")
+            elif result:
                 results[query_name] = result
         
         return results
@@ -99,67 +192,12 @@ class PrometheusClient:
         Returns:
             Dictionary of query names to PromQL queries
         """
-        queries = {}
-        instance = labels.get("instance", "")
-        job = labels.get("job", "")
-        component = labels.get("component", "")
-        
-        # CPU metrics
-        if component == "cpu" or "cpu" in labels.get("alertname", "").lower():
-            if instance:
-                queries["cpu_usage"] = f'100 - (avg by(instance) (irate(node_cpu_seconds_total{{mode="idle",instance="{instance}"}}[5m])) * 100)'
-                queries["cpu_by_mode"] = f'irate(node_cpu_seconds_total{{instance="{instance}"}}[5m])'
-            else:
-                queries["cpu_usage"] = '100 - (avg by(instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
-        
-        # Memory metrics
-        if component == "memory" or "memory" in labels.get("alertname", "").lower():
-            if instance:
-                queries["memory_usage"] = f'(1 - (node_memory_MemAvailable_bytes{{instance="{instance}"}} / node_memory_MemTotal_bytes{{instance="{instance}"}})) * 100'
-                queries["memory_details"] = f'node_memory_MemAvailable_bytes{{instance="{instance}"}}'
-            else:
-                queries["memory_usage"] = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
-        
-        # Disk metrics
-        if component == "disk" or "disk" in labels.get("alertname", "").lower():
-            if instance:
-                queries["disk_usage"] = f'(1 - (node_filesystem_avail_bytes{{instance="{instance}",fstype!="tmpfs"}} / node_filesystem_size_bytes{{instance="{instance}",fstype!="tmpfs"}})) * 100'
-            else:
-                queries["disk_usage"] = '(1 - (node_filesystem_avail_bytes{fstype!="tmpfs"} / node_filesystem_size_bytes{fstype!="tmpfs"})) * 100'
-        
-        # Instance availability
-        if job:
-            queries["instance_up"] = f'up{{job="{job}"}}'
-        elif instance:
-            queries["instance_up"] = f'up{{instance="{instance}"}}'
-        
-        # Load average
-        if instance:
-            queries["load_average"] = f'node_load1{{instance="{instance}"}}'
-        
-        # Network I/O
-        if instance:
-            queries["network_receive"] = f'irate(node_network_receive_bytes_total{{instance="{instance}"}}[5m])'
-            queries["network_transmit"] = f'irate(node_network_transmit_bytes_total{{instance="{instance}"}}[5m])'
-        
-        # Disk I/O
-        if instance:
-            queries["disk_read"] = f'irate(node_disk_read_bytes_total{{instance="{instance}"}}[5m])'
-            queries["disk_write"] = f'irate(node_disk_written_bytes_total{{instance="{instance}"}}[5m])'
-        
-        # If no specific queries were built, add generic queries
-        if not queries:
-            if instance:
-                queries["instance_up"] = f'up{{instance="{instance}"}}'
-                # Get any metrics for this instance
-                queries["all_metrics"] = f'{{instance="{instance}"}}'
-            elif job:
-                queries["job_up"] = f'up{{job="{job}"}}'
-            else:
-                # Last resort - get some metrics
-                queries["up_status"] = 'up'
-        
-        return queries
+        return dict(_build_metric_queries(
+            labels.get("instance", ""),
+            labels.get("job", ""),
+            labels.get("component", ""),
+            labels.get("alertname", "")
+        ))
     
     async def get_current_value(self, query: str) -> Optional[float]:
         """
@@ -175,19 +213,21 @@ class PrometheusClient:
         params = {"query": query}
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("status") == "success":
-                    results = data.get("data", {}).get("result", [])
-                    if results:
-                        value = results[0].get("value", [None, None])[1]
-                        return float(value) if value else None
+            response = await self._client.get(url, params=params)
+            response.raise_for_status()
+            data = decode_json(response)
+            
+            if data.get("status") == "success":
+                results = data.get("data", {}).get("result", [])
+                if results:
+                    value = results[0].get("value", [None, None])[1]
+                    return float(value) if value else None
         except Exception as e:
             logger.error(f"Error getting current value: {e}")
         
         return None
-
-
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool if this client created it"""
+        if self._owns_client:
+            await self._client.aclose()
@@ -1,63 +1,90 @@
-import os
+from functools import lru_cache
 from typing import Optional
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
+    # Each field is read from the environment variable of the same name
+    # (case-insensitive) or from .env, falling back to the default below
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
+    
     # Service URLs
-    prometheus_url: str = os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
-    loki_url: str = os.getenv("LOKI_URL", "http://loki:3100")
+    prometheus_url: str = "http://prometheus:9090"
+    loki_url: str = "http://loki:3100"
     
     # Huawei Cloud DeepSeek API Configuration (Competition)
     # API Endpoint for Huawei Cloud ModelArts
     # Note: Try both URL formats - with or without dash in "ap-southeast"
-    huawei_api_url: str = os.getenv(
-        "HUAWEI_API_URL", 
-        "https://pangu.ap-southeast-1.myhuaweicloud.com/api/v2/chat/completions"
-    )
+    huawei_api_url: str = "https://pangu.ap-southeast-1.myhuaweicloud.com/api/v2/chat/completions"
     # API Key (X-Auth-Token) - Replace with your competition API key
-    huawei_api_key: str = os.getenv("HUAWEI_API_KEY", "")
+    huawei_api_key: str = ""
     
     # Model Selection - Choose which Huawei Cloud model to use
     # Options: 
     #   - "deepseek-r1-distil-qwen-32b_raziqt" (More powerful, better for complex tasks)
     #   - "distill-llama-8b_46e6iu" (Faster, lighter)
-    huawei_model_name: str = os.getenv(
-        "HUAWEI_MODEL_NAME", 
-        "deepseek-r1-distil-qwen-32b_raziqt"
-    )
+    huawei_model_name: str = "deepseek-r1-distil-qwen-32b_raziqt"
     
     # Analysis Configuration
-    time_window_minutes: int = int(os.getenv("TIME_WINDOW_MINUTES", "15"))
-    max_log_lines: int = int(os.getenv("MAX_LOG_LINES", "500"))
-    max_metrics_points: int = int(os.getenv("MAX_METRICS_POINTS", "100"))
+    time_window_minutes: int = 15
+    max_log_lines: int = 20
+    max_metrics_points: int = 100
+    # Size budget (characters) for the log section of the LLM prompt
+    max_prompt_bytes: int = 6144
+    
+    # Alert Processing Configuration
+    # Number of concurrent queue consumers analyzing alerts
+    worker_concurrency: int = 4
+    # Maximum queued alerts; beyond this the webhook answers 503 so AlertManager retries
+    alert_queue_maxsize: int = 10000
+    # Maximum alerts a worker takes from the queue at once
+    alert_batch_size: int = 8
+    # Repeats of an already analyzed alert within this window reuse the result
+    alert_dedup_ttl_minutes: int = 5
+    alert_dedup_max_entries: int = 1024
     
     # Notification Configuration
-    slack_webhook_url: Optional[str] = os.getenv("SLACK_WEBHOOK_URL", None)
-    generic_webhook_url: Optional[str] = os.getenv("GENERIC_WEBHOOK_URL", None)
+    slack_webhook_url: Optional[str] = None
+    generic_webhook_url: Optional[str] = None
     
     # API Configuration
-    api_host: str = os.getenv("API_HOST", "0.0.0.0")
-    api_port: int = int(os.getenv("API_PORT", "8000"))
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    # Each worker process keeps its own alert queue and dedup state
+    api_workers: int = 1
     
     # LLM Configuration
     # Increased timeout for large Huawei models (can be slow)
-    llm_timeout: int = int(os.getenv("LLM_TIMEOUT", "180"))
-    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    llm_timeout: int = 180
+    llm_max_retries: int = 3
     # Temperature: 0.1 for precise answers, 0.7-0.8 for creative responses
-    llm_temperature: float = float(os.getenv("LLM_TEMPERATURE", "0.3"))
-    llm_max_tokens: int = int(os.getenv("LLM_MAX_TOKENS", "2000"))
-    llm_top_p: float = float(os.getenv("LLM_TOP_P", "0.9"))
-    llm_top_k: int = int(os.getenv("LLM_TOP_K", "40"))
+    llm_temperature: float = 0.3
+    llm_max_tokens: int = 2000
+    llm_top_p: float = 0.9
+    llm_top_k: int = 40
+    # Alerts analyzed within this window are sent as one LLM request (size 1 disables)
+    llm_batch_max_size: int = 4
+    llm_batch_max_wait_ms: int = 250
+    # Completion token limit for a batched request (llm_max_tokens per alert, capped)
+    llm_batch_max_tokens: int = 8192
+    # Stream completions and stop reading once the analysis JSON is complete
+    llm_stream: bool = True
+    # Reuse analyses for byte-identical prompts for this many seconds (0 disables)
+    llm_response_cache_ttl: int = 300
+    llm_response_cache_size: int = 1024
+    # Maximum LLM requests in flight at once; excess calls wait for a free slot
+    llm_max_concurrency: int = 8
     
     # Backward compatibility (deprecated, but kept for reference)
-    deepseek_api_key: str = os.getenv("DEEPSEEK_API_KEY", "")
-    deepseek_api_url: str = os.getenv("DEEPSEEK_API_URL", "")
-    deepseek_model: str = os.getenv("DEEPSEEK_MODEL", "")
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    deepseek_api_key: str = ""
+    deepseek_api_url: str = ""
+    deepseek_model: str = ""
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings instance, parsing the environment once"""
+    return Settings()
 
 
-settings = Settings()
+settings = get_settings()
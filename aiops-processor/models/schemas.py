@@ -1,10 +1,13 @@
 from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
 class Alert(BaseModel):
     """Single alert from AlertManager"""
+    # Unknown AlertManager fields are dropped rather than tracked
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+    
     status: str
     labels: Dict[str, str]
     annotations: Dict[str, str]
@@ -16,12 +19,14 @@ class Alert(BaseModel):
 
 class AlertWebhook(BaseModel):
     """Webhook payload from AlertManager"""
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+    
     receiver: str
     status: str
     alerts: List[Alert]
-    groupLabels: Optional[Dict[str, str]] = {}
-    commonLabels: Optional[Dict[str, str]] = {}
-    commonAnnotations: Optional[Dict[str, str]] = {}
+    groupLabels: Optional[Dict[str, str]] = Field(default_factory=dict)
+    commonLabels: Optional[Dict[str, str]] = Field(default_factory=dict)
+    commonAnnotations: Optional[Dict[str, str]] = Field(default_factory=dict)
     externalURL: Optional[str] = ""
     version: Optional[str] = "4"
     groupKey: Optional[str] = ""
@@ -37,7 +42,7 @@ class LogEntry(BaseModel):
     """Loki log entry"""
     timestamp: str
     line: str
-    labels: Optional[Dict[str, str]] = {}
+    labels: Optional[Dict[str, str]] = Field(default_factory=dict)
 
 
 class RemediationStep(BaseModel):
@@ -50,6 +55,9 @@ class RemediationStep(BaseModel):
 
 class AnalysisResult(BaseModel):
     """Complete analysis result from LLM"""
+    # Immutable so one result can be shared by deduplicated alerts
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     alert_name: str
     severity: str
     summary: str = ""
@@ -64,6 +72,8 @@ class AnalysisResult(BaseModel):
 
 class NotificationPayload(BaseModel):
     """Payload for notification services"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     alert_name: str
     severity: str
     instance: Optional[str] = None
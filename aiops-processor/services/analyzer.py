@@ -1,6 +1,8 @@
+import asyncio
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from clients.prometheus import PrometheusClient
 from clients.loki import LokiClient
 from clients.deepseek import DeepSeekClient
@@ -9,6 +11,18 @@ from models.schemas import Alert, AnalysisResult
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _parse_timestamp(value: str) -> datetime:
+    """
+    Parse an RFC 3339 timestamp, memoized since AlertManager resends the
+    same startsAt for every notification of an alert
+    
+    Python 3.11's fromisoformat accepts the "Z" suffix and fractional
+    seconds of any length, so no pre-processing is needed.
+    """
+    return datetime.fromisoformat(value)
+
+
 class AlertAnalyzer:
     """Orchestrates the alert analysis process"""
     
@@ -32,33 +46,54 @@ class AlertAnalyzer:
         Returns:
             AnalysisResult with root cause and remediation steps
         """
+        labels = alert.labels
+        alert_name = labels.get("alertname", "Unknown")
+        severity = labels.get("severity", "unknown")
+        
         try:
-            logger.info(f"Starting analysis for alert: {alert.labels.get('alertname', 'Unknown')}")
+            logger.info(f"Starting analysis for alert: {alert_name}")
             
             # Parse alert time
             alert_time = self._parse_alert_time(alert.startsAt)
             
             # Step 1: Gather context
-            alert_context = self._build_alert_context(alert)
+            alert_context = self._build_alert_context(alert, alert_name, severity)
             
-            # Step 2: Fetch Prometheus metrics
-            logger.info("Fetching Prometheus metrics...")
-            metrics_data = await self.prometheus.get_metrics_for_alert(
-                alert.labels,
-                alert_time
+            # Step 2: Fetch Prometheus metrics and Loki logs concurrently
+            logger.info("Fetching Prometheus metrics and Loki logs...")
+            metrics_data, logs_data = await asyncio.gather(
+                self.prometheus.get_metrics_for_alert(labels, alert_time),
+                self.loki.get_logs_for_alert(labels, alert_time),
+                return_exceptions=True
             )
-            logger.info(f"Retrieved {len(metrics_data)} metric queries")
             
-            # Step 3: Fetch Loki logs
-            logger.info("Fetching Loki logs...")
-            logs_data = await self.loki.get_logs_for_alert(
-                alert.labels,
-                alert_time
-            )
+            # A failing backend only removes its own context from the prompt
+            if isinstance(metrics_data, Exception):
+                logger.error(f"Failed to fetch Prometheus metrics: {metrics_data}")
+                metrics_data = {}
+            if isinstance(logs_data, Exception):
+                logger.error(f"Failed to fetch Loki logs: {logs_data}")
+                logs_data = {}
+            
+            logger.info(f"Retrieved {len(metrics_data)} metric queries")
             total_logs = sum(len(logs) for logs in logs_data.values())
             logger.info(f"Retrieved {total_logs} log entries from {len(logs_data)} queries")
             
-            # Step 4: Analyze with LLM
+            # Nothing for the LLM to correlate; skip the call entirely
+            if not metrics_data and not total_logs:
+                logger.warning(f"No metrics or logs found for {alert_name}, skipping LLM analysis")
+                return AnalysisResult(
+                    alert_name=alert_name,
+                    severity=severity,
+                    summary="No telemetry correlated with alert window",
+                    root_cause="Insufficient data",
+                    evidence=[],
+                    remediation_steps=[],
+                    severity_assessment="Unknown - Manual review required",
+                    confidence=0.0
+                )
+            
+            # Step 3: Analyze with LLM
             logger.info("Analyzing with LLM...")
             analysis = await self.llm.analyze_alert(
                 alert_context,
@@ -70,10 +105,10 @@ class AlertAnalyzer:
                 logger.error("LLM analysis failed")
                 return None
             
-            # Step 5: Build result
+            # Step 4: Build result
             result = AnalysisResult(
-                alert_name=alert.labels.get("alertname", "Unknown"),
-                severity=alert.labels.get("severity", "unknown"),
+                alert_name=alert_name,
+                severity=severity,
                 summary=analysis.get("summary", ""),
                 root_cause=analysis.get("root_cause", ""),
                 evidence=analysis.get("evidence", []),
@@ -82,7 +117,7 @@ class AlertAnalyzer:
                 confidence=analysis.get("confidence", 0.0)
             )
             
-            logger.info(f"Analysis completed successfully for {result.alert_name}")
+            logger.info(f"Analysis completed successfully for {alert_name}")
             return result
             
         except Exception as e:
@@ -100,63 +135,76 @@ class AlertAnalyzer:
             datetime object
         """
         try:
-            # Handle different timestamp formats
-            if "." in starts_at:
-                # Has microseconds
-                return datetime.fromisoformat(starts_at.replace("Z", "+00:00"))
-            else:
-                # No microseconds
-                return datetime.fromisoformat(starts_at.replace("Z", "+00:00"))
-        except Exception as e:
+            return _parse_timestamp(starts_at)
+        except (TypeError, ValueError) as e:
             logger.warning(f"Error parsing alert time '{starts_at}': {e}, using current time")
-            return datetime.utcnow()
+            # Timezone-aware like parsed times; a naive utcnow() would be
+            # read as local time by .timestamp() in the query clients
+            return datetime.now(timezone.utc)
     
-    def _build_alert_context(self, alert: Alert) -> Dict[str, Any]:
+    def _build_alert_context(
+        self,
+        alert: Alert,
+        alert_name: str = None,
+        severity: str = None
+    ) -> Dict[str, Any]:
         """
         Build context dictionary from alert
         
         Args:
             alert: Alert object
+            alert_name: Alert name if already looked up from the labels
+            severity: Severity if already looked up from the labels
         
         Returns:
             Context dictionary for LLM
         """
+        labels = alert.labels
+        annotations = alert.annotations
         context = {
-            "alertname": alert.labels.get("alertname", "Unknown"),
-            "severity": alert.labels.get("severity", "unknown"),
+            "alertname": alert_name or labels.get("alertname", "Unknown"),
+            "severity": severity or labels.get("severity", "unknown"),
             "status": alert.status,
-            "summary": alert.annotations.get("summary", ""),
-            "description": alert.annotations.get("description", ""),
-            "runbook_url": alert.annotations.get("runbook_url", ""),
-            "labels": alert.labels,
+            "summary": annotations.get("summary", ""),
+            "description": annotations.get("description", ""),
+            "runbook_url": annotations.get("runbook_url", ""),
+            "labels": labels,
             "starts_at": alert.startsAt,
             "generator_url": alert.generatorURL
         }
         
         return context
     
-    async def batch_analyze_alerts(self, alerts: list[Alert]) -> list[AnalysisResult]:
+    async def batch_analyze_alerts(
+        self,
+        alerts: list[Alert],
+        max_concurrency: int = 8
+    ) -> list[AnalysisResult]:
         """
-        Analyze multiple alerts
+        Analyze multiple alerts concurrently
         
         Args:
             alerts: List of Alert objects
+            max_concurrency: Maximum number of alerts analyzed at once
         
         Returns:
-            List of AnalysisResult objects
+            List of AnalysisResult objects, in input order
         """
-        results = []
-        
+        active = []
         for alert in alerts:
             # Skip resolved alerts unless needed
             if alert.status == "resolved":
                 logger.info(f"Skipping resolved alert: {alert.labels.get('alertname')}")
                 continue
-            
-            result = await self.analyze_alert(alert)
-            if result:
-                results.append(result)
+            active.append(alert)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def analyze_one(alert: Alert) -> Optional[AnalysisResult]:
+            async with semaphore:
+                return await self.analyze_alert(alert)
         
-        return results
+        results = await asyncio.gather(*(analyze_one(alert) for alert in active))
+        return [result for result in results if result]
 
 
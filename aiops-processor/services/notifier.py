@@ -4,10 +4,49 @@ import json
 from typing import Optional
 from datetime import datetime
 from models.schemas import AnalysisResult, NotificationPayload
+from clients.http import JSON_HEADERS, create_http_client, encode_json
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Slack attachment color and display label per severity
+_SEVERITY_TABLE = {
+    "critical": ("#d32f2f", "CRITICAL"),  # Red
+    "warning": ("#f57c00", "WARNING"),    # Orange
+    "info": ("#1976d2", "INFO")           # Blue
+}
+_DEFAULT_SEVERITY_COLOR = "#757575"       # Grey
+
+# Slack block texts; only the placeholders change between alerts
+_SLACK_HEADER_TEMPLATE = "🚨 Alert Analysis: {alert_name}"
+_SLACK_FIELD_TEMPLATES = (
+    "*Severity:*\n{severity}",
+    "*Confidence:*\n{confidence}"
+)
+_SLACK_SECTION_TEMPLATES = (
+    "*Summary:*\n{summary}",
+    "*Root Cause:*\n{root_cause}",
+    "*Evidence:*\n{evidence}",
+    "*Remediation Steps:*\n{remediation}",
+    "*Severity Assessment:*\n{severity_assessment}"
+)
+_SLACK_CONTEXT_TEMPLATE = "Analyzed at {analyzed_at} | <{prometheus_url}|Prometheus Dashboard>"
+
+# Compiled pydantic-core serializer, called directly to skip the model_dump /
+# model_dump_json wrappers
+_ANALYSIS_SERIALIZER = AnalysisResult.__pydantic_serializer__
+
+# AnalysisResult fields forwarded to the generic webhook
+_WEBHOOK_ANALYSIS_FIELDS = {
+    "summary",
+    "root_cause",
+    "evidence",
+    "remediation_steps",
+    "severity_assessment",
+    "confidence",
+    "analyzed_at"
+}
+
 
 class NotificationService:
     """Service for sending notifications about alert analysis"""
@@ -15,11 +54,15 @@ class NotificationService:
     def __init__(
         self,
         slack_webhook_url: str = None,
-        generic_webhook_url: str = None
+        generic_webhook_url: str = None,
+        http_client: httpx.AsyncClient = None
     ):
         self.slack_webhook_url = slack_webhook_url or settings.slack_webhook_url
         self.generic_webhook_url = generic_webhook_url or settings.generic_webhook_url
         self.timeout = 10.0
+        # Reuse keep-alive connections to the webhook hosts across notifications
+        self._owns_client = http_client is None
+        self._client = http_client or create_http_client(self.timeout)
     
     async def send_analysis(
         self,
@@ -36,10 +79,19 @@ class NotificationService:
         Returns:
             True if at least one notification was sent successfully
         """
+        # Log if no notifications were configured
+        if not self.slack_webhook_url and not self.generic_webhook_url:
+            logger.warning("No notification channels configured. Logging analysis result:")
+            # Only serialize the analysis if the record will actually be emitted
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Analysis: {_ANALYSIS_SERIALIZER.to_json(analysis, indent=2).decode()}")
+            return True  # Consider it successful if we logged it
+        
         success = False
         
-        # Build notification payload
-        payload = NotificationPayload(
+        # Build notification payload; the analysis is already validated, so
+        # skip re-validating it
+        payload = NotificationPayload.model_construct(
             alert_name=analysis.alert_name,
             severity=analysis.severity,
             instance=alert_context.get("instance") if alert_context else None,
@@ -58,12 +110,6 @@ class NotificationService:
             webhook_success = await self._send_generic_webhook(payload)
             success = success or webhook_success
         
-        # Log if no notifications were configured
-        if not self.slack_webhook_url and not self.generic_webhook_url:
-            logger.warning("No notification channels configured. Logging analysis result:")
-            logger.info(f"Analysis: {analysis.model_dump_json(indent=2)}")
-            success = True  # Consider it successful if we logged it
-        
         return success
     
     async def _send_slack_notification(self, payload: NotificationPayload) -> bool:
@@ -80,12 +126,13 @@ class NotificationService:
             # Build Slack message
             slack_message = self._build_slack_message(payload)
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.slack_webhook_url,
-                    json=slack_message
-                )
-                response.raise_for_status()
+            response = await self._client.post(
+                self.slack_webhook_url,
+                content=encode_json(slack_message),
+                headers=JSON_HEADERS,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
             
             logger.info(f"Successfully sent Slack notification for {payload.alert_name}")
             return True
@@ -98,85 +145,59 @@ class NotificationService:
         """Build a formatted Slack message"""
         analysis = payload.analysis
         
-        # Determine color based on severity
-        color_map = {
-            "critical": "#d32f2f",  # Red
-            "warning": "#f57c00",   # Orange
-            "info": "#1976d2"       # Blue
-        }
-        color = color_map.get(payload.severity.lower(), "#757575")
+        # Determine color and display label based on severity; AlertManager
+        # severities are normally lowercase, so case-fold only on a miss
+        severity = payload.severity
+        color, severity_label = (
+            _SEVERITY_TABLE.get(severity)
+            or _SEVERITY_TABLE.get(severity.lower())
+            or (_DEFAULT_SEVERITY_COLOR, severity.upper())
+        )
         
         # Build evidence text
-        evidence_text = "\n".join([f"• {ev}" for ev in analysis.evidence[:5]])
+        evidence_text = "\n".join(map("• {}".format, analysis.evidence[:5]))
         
         # Build remediation steps
-        remediation_text = "\n".join([f"{i+1}. {step}" for i, step in enumerate(analysis.remediation_steps)])
+        remediation_text = "\n".join(f"{i}. {step}" for i, step in enumerate(analysis.remediation_steps, 1))
         
-        # Build the message
+        values = {
+            "alert_name": payload.alert_name,
+            "severity": severity_label,
+            "confidence": f"{analysis.confidence:.0%}",
+            "summary": analysis.summary,
+            "root_cause": analysis.root_cause,
+            "evidence": evidence_text,
+            "remediation": remediation_text,
+            "severity_assessment": analysis.severity_assessment,
+            "analyzed_at": analysis.analyzed_at,
+            "prometheus_url": payload.prometheus_url
+        }
+        
+        # Build the message from the fixed block layout
         blocks = [
             {
                 "type": "header",
                 "text": {
                     "type": "plain_text",
-                    "text": f"🚨 Alert Analysis: {payload.alert_name}",
+                    "text": _SLACK_HEADER_TEMPLATE.format_map(values),
                     "emoji": True
                 }
             },
             {
                 "type": "section",
                 "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Severity:*\n{payload.severity.upper()}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Confidence:*\n{analysis.confidence:.0%}"
-                    }
+                    {"type": "mrkdwn", "text": template.format_map(values)}
+                    for template in _SLACK_FIELD_TEMPLATES
                 ]
             },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Summary:*\n{analysis.summary}"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Root Cause:*\n{analysis.root_cause}"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Evidence:*\n{evidence_text}"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Remediation Steps:*\n{remediation_text}"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Severity Assessment:*\n{analysis.severity_assessment}"
-                }
-            },
+            *(
+                {"type": "section", "text": {"type": "mrkdwn", "text": template.format_map(values)}}
+                for template in _SLACK_SECTION_TEMPLATES
+            ),
             {
                 "type": "context",
                 "elements": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"Analyzed at {analysis.analyzed_at} | <{payload.prometheus_url}|Prometheus Dashboard>"
-                    }
+                    {"type": "mrkdwn", "text": _SLACK_CONTEXT_TEMPLATE.format_map(values)}
                 ]
             }
         ]
@@ -206,27 +227,24 @@ class NotificationService:
                 "alert_name": payload.alert_name,
                 "severity": payload.severity,
                 "instance": payload.instance,
-                "analysis": {
-                    "summary": payload.analysis.summary,
-                    "root_cause": payload.analysis.root_cause,
-                    "evidence": payload.analysis.evidence,
-                    "remediation_steps": payload.analysis.remediation_steps,
-                    "severity_assessment": payload.analysis.severity_assessment,
-                    "confidence": payload.analysis.confidence,
-                    "analyzed_at": payload.analysis.analyzed_at
-                },
+                "analysis": _ANALYSIS_SERIALIZER.to_python(
+                    payload.analysis,
+                    mode="json",
+                    include=_WEBHOOK_ANALYSIS_FIELDS
+                ),
                 "urls": {
                     "alert": payload.alert_url,
                     "prometheus": payload.prometheus_url
                 }
             }
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.generic_webhook_url,
-                    json=webhook_data
-                )
-                response.raise_for_status()
+            response = await self._client.post(
+                self.generic_webhook_url,
+                content=encode_json(webhook_data),
+                headers=JSON_HEADERS,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
             
             logger.info(f"Successfully sent webhook notification for {payload.alert_name}")
             return True
@@ -245,8 +263,8 @@ class NotificationService:
         Returns:
             Formatted text string
         """
-        evidence_text = "\n".join([f"  - {ev}" for ev in analysis.evidence])
-        remediation_text = "\n".join([f"  {i+1}. {step}" for i, step in enumerate(analysis.remediation_steps)])
+        evidence_text = "\n".join(map("  - {}".format, analysis.evidence))
+        remediation_text = "\n".join(f"  {i}. {step}" for i, step in enumerate(analysis.remediation_steps, 1))
         
         return f"""
 Alert Analysis: {analysis.alert_name}
@@ -270,5 +288,8 @@ Severity Assessment:
 
 Analyzed at: {analysis.analyzed_at}
 """
-
-
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool if this service created it"""
+        if self._owns_client:
+            await self._client.aclose()
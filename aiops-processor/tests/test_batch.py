@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import httpx
+
+from clients.deepseek import _BATCH_SYSTEM_PREFIX, DeepSeekClient
+
+ANSWER = {
+    "summary": "s",
+    "root_cause": "r",
+    "evidence": [],
+    "remediation_steps": [],
+    "severity_assessment": "Low",
+    "confidence": 0.5
+}
+
+
+def make_client(responses):
+    """Client whose _call_api pops canned responses and records each call"""
+    client = DeepSeekClient(api_key="test", api_url="http://llm.invalid")
+    calls = []
+    client.requested_max_tokens = []
+    
+    async def fake_call_api(prompt, system_prompt=None, max_tokens=None, batch_size=None):
+        calls.append(system_prompt)
+        client.requested_max_tokens.append(max_tokens)
+        response = responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+    
+    client._call_api = fake_call_api
+    return client, calls
+
+
+def test_batch_uses_array_system_prefix():
+    client, calls = make_client([json.dumps([ANSWER, ANSWER])])
+    results = asyncio.run(client._analyze_batch_prompts(["a", "b"]))
+    assert calls == [_BATCH_SYSTEM_PREFIX]
+    assert [r["summary"] for r in results] == ["s", "s"]
+
+
+def test_failed_batch_request_is_not_retried_per_prompt():
+    error = httpx.ConnectError("down")
+    client, calls = make_client([error])
+    results = asyncio.run(client._analyze_batch_prompts(["a", "b", "c"]))
+    assert len(calls) == 1
+    assert results == [error] * 3
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://llm.invalid")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+
+def test_transient_status_fails_the_batch():
+    error = status_error(503)
+    client, calls = make_client([error])
+    results = asyncio.run(client._analyze_batch_prompts(["a", "b"]))
+    assert len(calls) == 1
+    assert results == [error] * 2
+
+
+def test_rejected_batch_falls_back_to_individual_calls():
+    client, calls = make_client([status_error(413), json.dumps(ANSWER), json.dumps(ANSWER)])
+    results = asyncio.run(client._analyze_batch_prompts(["a", "b"]))
+    assert len(calls) == 3
+    assert [r["summary"] for r in results] == ["s", "s"]
+
+
+def test_batch_max_tokens_is_capped():
+    client, _ = make_client([json.dumps([ANSWER] * 4)])
+    client.max_tokens = 3000
+    client.batch_max_tokens = 8192
+    asyncio.run(client._analyze_batch_prompts(["a", "b", "c", "d"]))
+    assert client.requested_max_tokens == [8192]
+
+
+def test_unsplittable_batch_falls_back_to_individual_calls():
+    client, calls = make_client([json.dumps([ANSWER]), json.dumps(ANSWER), json.dumps(ANSWER)])
+    results = asyncio.run(client._analyze_batch_prompts(["a", "b"]))
+    assert len(calls) == 3
+    assert [r["summary"] for r in results] == ["s", "s"]
+
+
+def sse_body(text: str, size: int = 7) -> bytes:
+    """Encode text as OpenAI-style SSE delta frames"""
+    frames = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": text[i:i + size]}}]})
+        for i in range(0, len(text), size)
+    ]
+    return ("\n\n".join(frames + ["data: [DONE]"]) + "\n\n").encode()
+
+
+def test_streamed_batch_with_list_in_reasoning_needs_one_request():
+    requests = []
+    answer = "the CPU values [93.1, 95.2] look high</think>" + json.dumps([ANSWER] * 3)
+    
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=sse_body(answer))
+    
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            client = DeepSeekClient(api_key="test", api_url="http://llm.invalid", http_client=http_client)
+            client.stream = True
+            return await client._analyze_batch_prompts(["a", "b", "c"])
+    
+    results = asyncio.run(run())
+    assert len(requests) == 1
+    assert [r["summary"] for r in results] == ["s", "s", "s"]
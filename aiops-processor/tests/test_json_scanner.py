@@ -0,0 +1,103 @@
+import json
+
+from clients.deepseek import _JsonObjectScanner, _strip_reasoning
+
+ANSWER = {
+    "summary": "real",
+    "root_cause": "r",
+    "evidence": ["a [5m] b"],
+    "remediation_steps": ["fix {it}"],
+    "severity_assessment": "High",
+    "confidence": 0.9
+}
+ANSWER_TEXT = json.dumps(ANSWER)
+
+
+def feed_chunks(scanner: _JsonObjectScanner, text: str, size: int = 5) -> bool:
+    """Feed text in small chunks like SSE deltas; return whether it completed"""
+    for i in range(0, len(text), size):
+        if scanner.feed(text[i:i + size]):
+            return True
+    return False
+
+
+def test_plain_answer():
+    scanner = _JsonObjectScanner()
+    assert feed_chunks(scanner, ANSWER_TEXT + " trailing text")
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_closing_think_tag_without_opening_tag():
+    text = (
+        'The irate(node_cpu_seconds_total{mode="idle"}[5m]) series and '
+        '[2024-01-01T00:00:00] log lines show {"draft": 1} </think>\n' + ANSWER_TEXT
+    )
+    scanner = _JsonObjectScanner()
+    assert feed_chunks(scanner, text)
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_unterminated_think_block_is_not_scanned():
+    scanner = _JsonObjectScanner()
+    assert not feed_chunks(scanner, "<think>maybe " + ANSWER_TEXT)
+    assert scanner.json_text is None
+    assert feed_chunks(scanner, " no wait</think>" + ANSWER_TEXT)
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_brackets_do_not_start_single_answer():
+    scanner = _JsonObjectScanner()
+    assert not scanner.feed("Looking at [5m] windows and [1, 2] ")
+    assert scanner.feed(ANSWER_TEXT)
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_invalid_candidate_keeps_reading():
+    scanner = _JsonObjectScanner()
+    assert not scanner.feed('Selector {instance="a"} is relevant. ')
+    assert scanner.json_text is None
+    assert scanner.feed(ANSWER_TEXT)
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_braces_inside_strings():
+    answer = dict(ANSWER, summary='closing } and "quoted \\" brace {')
+    scanner = _JsonObjectScanner()
+    assert feed_chunks(scanner, json.dumps(answer), size=3)
+    assert json.loads(scanner.json_text) == answer
+
+
+def test_array_expected_for_batches():
+    batch = json.dumps([ANSWER, ANSWER])
+    scanner = _JsonObjectScanner(batch_size=2)
+    assert not scanner.feed("Using [5m] rate windows, ")
+    assert feed_chunks(scanner, batch)
+    assert json.loads(scanner.json_text) == [ANSWER, ANSWER]
+
+
+def test_batch_ignores_lists_in_untagged_reasoning():
+    batch = json.dumps([ANSWER, ANSWER, ANSWER])
+    scanner = _JsonObjectScanner(batch_size=3)
+    assert not feed_chunks(scanner, "the CPU values [93.1, 95.2] look high, ")
+    assert not feed_chunks(scanner, "draft: [" + ANSWER_TEXT + "] then ")
+    assert feed_chunks(scanner, "</think>" + batch)
+    assert json.loads(scanner.json_text) == [ANSWER, ANSWER, ANSWER]
+
+
+def test_partial_draft_in_untagged_reasoning_is_skipped():
+    scanner = _JsonObjectScanner()
+    assert not feed_chunks(scanner, 'maybe {"summary": "draft"} fits. ')
+    assert feed_chunks(scanner, ANSWER_TEXT)
+    assert json.loads(scanner.json_text) == ANSWER
+
+
+def test_incomplete_answer():
+    scanner = _JsonObjectScanner()
+    assert not feed_chunks(scanner, ANSWER_TEXT[:-1])
+    assert scanner.json_text is None
+    assert scanner.text == ANSWER_TEXT[:-1]
+
+
+def test_strip_reasoning():
+    assert _strip_reasoning("thinking {x}</think>\n{}") == "\n{}"
+    assert _strip_reasoning("{}") == "{}"
@@ -0,0 +1,22 @@
+from app import app
+
+
+def request_body(path: str) -> dict:
+    return app.openapi()["paths"][path]["post"]["requestBody"]
+
+
+def test_webhook_documents_request_body():
+    body = request_body("/webhook/alerts")
+    schema = body["content"]["application/json"]["schema"]
+    assert body["required"] is True
+    assert schema["required"] == ["receiver", "status", "alerts"]
+    assert "$ref" not in str(schema)
+    assert "labels" in schema["properties"]["alerts"]["items"]["properties"]
+
+
+def test_analyze_documents_request_body():
+    body = request_body("/analyze")
+    schema = body["content"]["application/json"]["schema"]
+    assert body["required"] is True
+    assert schema["title"] == "Alert"
+    assert {"labels", "annotations", "startsAt"} <= set(schema["properties"])
@@ -0,0 +1,97 @@
+from clients import deepseek
+from clients.deepseek import DeepSeekClient, _summarize_series
+
+
+def test_series_stats_skip_nan_and_inf():
+    values = [[i, str(i)] for i in range(20)]
+    values[3][1] = "NaN"
+    values[7][1] = "+Inf"
+    values[11][1] = "-Inf"
+    summary = _summarize_series(values)
+    assert "n=20" in summary
+    assert "min=0 max=19" in summary
+    assert "sd=" in summary
+
+
+def test_series_without_finite_values_has_no_stats():
+    summary = _summarize_series([[i, "NaN"] for i in range(12)])
+    assert summary == "nan,nan,nan n=12"
+
+
+def test_prompt_builds_with_nan_samples():
+    values = [[i, str(i)] for i in range(20)]
+    values[5][1] = "NaN"
+    client = DeepSeekClient(api_key="test", api_url="http://llm.invalid")
+    prompt = client._build_analysis_prompt(
+        {"alertname": "HighLatency"},
+        {"latency_p99": [{"metric": {"job": "api"}, "values": values}]},
+        {}
+    )
+    assert "job=api | 0,10,19 n=20 min=0 max=19" in prompt
+
+
+def log_entries(start: int, stop: int) -> list:
+    return [
+        {"line": f"ERROR payment timeout order={i}", "timestamp_ns": str(1700000000000000000 + i * 10**9)}
+        for i in range(start, stop)
+    ]
+
+
+def expand_log_sections(text: str) -> dict:
+    """Rebuild each query's log lines from the prompt, resolving [ref:id] lines"""
+    sections = {}
+    refs = {}
+    lines = None
+    capturing = None
+    for line in text.splitlines():
+        if line.startswith("**"):
+            lines = sections.setdefault(line.split("**")[1], [])
+            capturing = None
+        elif line.endswith("first shown here:"):
+            capturing = refs.setdefault(line.split("ref:")[1].split("]")[0], [])
+        elif line.startswith("  [ref:"):
+            lines.extend(refs[line.strip()[5:-1]])
+            capturing = None
+        elif lines is not None and line.startswith("  ["):
+            lines.append(line)
+            if capturing is not None:
+                capturing.append(line)
+    return sections
+
+
+def logs_prompt(logs: dict) -> str:
+    client = DeepSeekClient(api_key="test", api_url="http://llm.invalid")
+    return client._format_logs_for_prompt(logs)
+
+
+def test_overlapping_log_queries_keep_every_line():
+    logs = {
+        '{app="api"} |= "error"': log_entries(0, 10),
+        '{app="api"}': log_entries(3, 13),
+        '{app="db"}': log_entries(0, 10),
+    }
+    text = logs_prompt(logs)
+    assert "[ref:" in text
+    
+    sections = expand_log_sections(text)
+    for query, entries in logs.items():
+        assert [line.split("] ", 1)[1] for line in sections[query]] == [e["line"] for e in entries]
+
+
+def test_log_blocks_with_colliding_hashes_keep_distinct_labels(monkeypatch):
+    class ConstantDigest:
+        def __init__(self, data):
+            pass
+        
+        def hexdigest(self):
+            return "0" * 40
+    
+    monkeypatch.setattr(deepseek.hashlib, "sha1", ConstantDigest)
+    logs = {"first": log_entries(0, 10), "second": log_entries(0, 10)}
+    text = logs_prompt(logs)
+    
+    labels = {line.strip() for line in text.splitlines() if line.endswith("first shown here:")}
+    assert len(labels) == 3
+    sections = expand_log_sections(text)
+    assert sections["first"] == sections["second"]
+    assert len(sections["second"]) == 10